@@ -1,51 +1,168 @@
+import asyncio
+import collections
+import http.server
+import concurrent.futures
 import ctypes
 import os
+import random
 import subprocess
 import ipaddress
+from multiprocessing import shared_memory
 import signal
+import socket
+import struct
+import threading
+import time
+import numpy as np
 
 # V1.0.0 - Initial commit
 # V1.0.1 - Added: add handling function for implicit IP address setup of host PC  
 ilidar_wrapper_version = "V1.0.1"
 CALLBACK_TYPE = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_uint16))
 
-# Get IP list
-def get_ip_list():
+# Host IPv4 interface
+HostInterface = collections.namedtuple('HostInterface', ['name', 'ip', 'netmask', 'broadcast'])
+
+# getifaddrs() list node (Linux, macOS and BSD)
+class _IfAddrs(ctypes.Structure):
+    pass
+
+_IfAddrs._fields_ = [
+    ('ifa_next', ctypes.POINTER(_IfAddrs)),
+    ('ifa_name', ctypes.c_char_p),
+    ('ifa_flags', ctypes.c_uint),
+    ('ifa_addr', ctypes.c_void_p),
+    ('ifa_netmask', ctypes.c_void_p),
+    ('ifa_broadaddr', ctypes.c_void_p),
+    ('ifa_data', ctypes.c_void_p),
+]
+
+# Cached interface table
+_interface_table = None
+_interface_table_lock = threading.Lock()
+
+# IPv4 address of a struct sockaddr pointer, '' when it is not AF_INET
+def _sockaddr_ipv4(ptr):
+    if not ptr:
+        return ''
+    raw = ctypes.string_at(ptr, 8)
+    # BSD/macOS sockaddr starts with sa_len, Linux with a 16-bit sa_family
+    family = raw[1] if os.uname().sysname != 'Linux' else int.from_bytes(raw[0:2], 'little')
+    if family != socket.AF_INET:
+        return ''
+    return socket.inet_ntoa(ctypes.string_at(ptr + 4, 4))
+
+# Enumerate every IPv4 address of every interface with getifaddrs() (no subprocess)
+# Unlike SIOCGIFADDR this also returns secondary and alias addresses.
+def _read_interfaces_getifaddrs():
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.getifaddrs.argtypes = [ctypes.POINTER(ctypes.POINTER(_IfAddrs))]
+    libc.getifaddrs.restype = ctypes.c_int
+    libc.freeifaddrs.argtypes = [ctypes.POINTER(_IfAddrs)]
+    libc.freeifaddrs.restype = None
+
+    head = ctypes.POINTER(_IfAddrs)()
+    if libc.getifaddrs(ctypes.byref(head)) != 0:
+        raise OSError(ctypes.get_errno(), "getifaddrs failed")
+
+    interfaces = []
+    try:
+        node = head
+        while node:
+            ifa = node.contents
+            ip = _sockaddr_ipv4(ifa.ifa_addr)
+            if ip != '':
+                netmask = _sockaddr_ipv4(ifa.ifa_netmask)
+                # Derived from the netmask: without an explicit `brd` the kernel reports the address itself
+                broadcast = get_broadcast_ip(ip, netmask) if netmask != '' else ''
+                interfaces.append(HostInterface(ifa.ifa_name.decode(errors='replace'), ip, netmask, broadcast))
+            node = ifa.ifa_next
+    finally:
+        libc.freeifaddrs(head)
+    return interfaces
+
+# Enumerate interfaces by parsing ipconfig, ifconfig or ip addr (one subprocess for all interfaces)
+def _read_interfaces_subprocess():
+    interfaces = []
     if os.name == "nt":
-        ip_addresses = []
-        
         # Use ipconfig to get all IPs
         result = subprocess.run(['ipconfig'], stdout=subprocess.PIPE, text=True)
-        
-        # Parse the output to find IP addresses
-        lines = result.stdout.splitlines()
-        for line in lines:
+
+        # The subnet mask follows the IPv4 address line
+        ip = ''
+        for line in result.stdout.splitlines():
             if 'IPv4' in line:
-                ip = line.split(':')[1].replace(' ', '')
-                if ip != '127.0.0.1' and ip not in ip_addresses:
-                    ip_addresses.append(ip)
-        
-        return ip_addresses
-    else:
-        ip_addresses = []
+                ip = line.split(':')[1].replace(' ', '').replace('(Preferred)', '')
+            elif ip != '':
+                netmask = line.split(':')[1].replace(' ', '') if ':' in line else ''
+                broadcast = get_broadcast_ip(ip, netmask) if is_ip(netmask) else ''
+                interfaces.append(HostInterface('', ip, netmask, broadcast))
+                ip = ''
+        return interfaces
 
-        # Additional IPs using ifconfig or ip command
-        try:
-            # Use `ifconfig` (for Unix-based systems)
-            result = subprocess.run(['ifconfig'], stdout=subprocess.PIPE, text=True)
-        except FileNotFoundError:
-            # Use `ip` (for Linux systems that don’t have ifconfig)
-            result = subprocess.run(['ip', 'addr'], stdout=subprocess.PIPE, text=True)
-
-        # Parse the output to find IP addresses
-        lines = result.stdout.splitlines()
-        for line in lines:
-            if 'inet ' in line:
-                ip = line.strip().split()[1].split('/')[0]
-                if ip != '127.0.0.1' and ip not in ip_addresses:
-                    ip_addresses.append(ip)
-        
-        return ip_addresses
+    try:
+        # Use `ifconfig` (for Unix-based systems)
+        result = subprocess.run(['ifconfig'], stdout=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        # Use `ip` (for Linux systems that don’t have ifconfig)
+        result = subprocess.run(['ip', 'addr'], stdout=subprocess.PIPE, text=True)
+
+    name = ''
+    for line in result.stdout.splitlines():
+        if len(line) > 0 and not line[0].isspace():
+            # Interface header: "eth0: flags=..." or "2: eth0: <...>"
+            fields = line.replace(':', ' ').split()
+            name = fields[1] if fields[0].isdigit() and len(fields) > 1 else fields[0]
+        fields = line.strip().split()
+        if len(fields) < 2 or fields[0] != 'inet':
+            continue
+
+        if '/' in fields[1]:
+            ip, prefix = fields[1].split('/')
+            netmask = str(ipaddress.IPv4Network(f'0.0.0.0/{prefix}').netmask)
+        else:
+            ip = fields[1].replace('addr:', '')
+            netmask = ''
+            for key, value in zip(fields, fields[1:]):
+                if key in ('netmask', 'Mask:'):
+                    netmask = value
+            if fields[-1].startswith('Mask:'):
+                netmask = fields[-1][5:]
+            if netmask.startswith('0x'):
+                netmask = socket.inet_ntoa(int(netmask, 16).to_bytes(4, 'big'))
+        broadcast = get_broadcast_ip(ip, netmask) if is_ip(netmask) else ''
+        interfaces.append(HostInterface(name, ip, netmask, broadcast))
+    return interfaces
+
+# Get the host IPv4 interface table (cached until invalidate_interfaces() or refresh=True)
+def get_interfaces(refresh=False):
+    global _interface_table
+    with _interface_table_lock:
+        if _interface_table is None or refresh:
+            interfaces = None
+            if os.name != "nt":
+                try:
+                    interfaces = _read_interfaces_getifaddrs()
+                except (OSError, AttributeError):
+                    interfaces = None
+            if interfaces is None:
+                interfaces = _read_interfaces_subprocess()
+            _interface_table = interfaces
+        return list(_interface_table)
+
+# Drop the cached interface table (e.g. after a network change)
+def invalidate_interfaces():
+    global _interface_table
+    with _interface_table_lock:
+        _interface_table = None
+
+# Get IP list
+def get_ip_list():
+    ip_addresses = []
+    for interface in get_interfaces():
+        if interface.ip != '127.0.0.1' and interface.ip not in ip_addresses:
+            ip_addresses.append(interface.ip)
+    return ip_addresses
 
 # IP check
 def is_ip(str):
@@ -57,43 +174,10 @@ def is_ip(str):
 
 # Get subnet mask
 def get_subnet_mask(ip):
-    if os.name == "nt":
-        # Use ipconfig to get all IPs
-        result = subprocess.run(['ipconfig'], stdout=subprocess.PIPE, text=True)
-        
-        # Parse the output to find IP addresses
-        lines = result.stdout.splitlines()
-        found_idx = -1
-        for line_idx, line in enumerate(lines, start=1):
-            if 'IPv4' in line:
-                host_ip = line.split(':')[1].replace(' ', '')
-                if ip == host_ip:
-                    found_idx = line_idx
-            
-            if line_idx == found_idx + 1:
-                host_subnet = line.split(':')[1].replace(' ', '')
-                return host_subnet
-        
-        return ''
-    else:
-        # Additional IPs using ifconfig or ip command
-        try:
-            # Use `ifconfig` (for Unix-based systems)
-            result = subprocess.run(['ifconfig'], stdout=subprocess.PIPE, text=True)
-        except FileNotFoundError:
-            # Use `ip` (for Linux systems that don’t have ifconfig)
-            result = subprocess.run(['ip', 'addr'], stdout=subprocess.PIPE, text=True)
-
-        # Parse the output to find IP addresses
-        lines = result.stdout.splitlines()
-        for line_idx, line in enumerate(lines, start=1):
-            if 'inet' in line:
-                host_ip = line.strip().split()[1].split('/')[0]
-                host_subnet = line.strip().split()[3].split('/')[0]
-                if ip == host_ip:
-                    return host_subnet
-
-        return ''
+    for interface in get_interfaces():
+        if interface.ip == ip:
+            return interface.netmask
+    return ''
 
 # Get broadcast ip
 def get_broadcast_ip(ip, subnet):
@@ -109,370 +193,2196 @@ def get_ip_array(ip_str):
     ip_parts = [int(x) for x in ip_str.split('.')]
     return (ctypes.c_uint8 * 4)(*ip_parts)
 
+# Field of the info_v2 block
+# kind: 'B' (u8), 'H' (u16), 'I' (u32) or 's' (raw bytes, count = length), fmt: print format ('ip', 'mac' or '')
+InfoV2Field = collections.namedtuple('InfoV2Field', ['name', 'kind', 'count', 'writable', 'fmt'])
+
+# Layout of the 166-byte info_v2 block for F/W V1.5.0+ (little endian, packed)
+# Read only fields are written as 0 by encode_info_v2()
+INFO_V2_LAYOUT = [
+    InfoV2Field('sensor_sn', 'H', 1, True, ''),
+    InfoV2Field('sensor_hw_id', 's', 30, False, ''),
+    InfoV2Field('sensor_fw_ver', 's', 3, False, ''),
+    InfoV2Field('sensor_fw_date', 's', 12, False, ''),
+    InfoV2Field('sensor_fw_time', 's', 9, False, ''),
+    InfoV2Field('sensor_calib_id', 'I', 1, False, ''),
+    InfoV2Field('sensor_fw0_ver', 's', 3, False, ''),
+    InfoV2Field('sensor_fw1_ver', 's', 3, False, ''),
+    InfoV2Field('sensor_fw2_ver', 's', 3, False, ''),
+    InfoV2Field('sensor_model_id', 'B', 1, False, ''),
+    InfoV2Field('sensor_boot_ctrl', 'B', 1, False, ''),
+    InfoV2Field('capture_mode', 'B', 1, True, ''),
+    InfoV2Field('capture_row', 'B', 1, True, ''),
+    InfoV2Field('capture_shutter', 'H', 5, True, ''),
+    InfoV2Field('capture_limit', 'H', 2, True, ''),
+    InfoV2Field('capture_period_us', 'I', 1, True, ''),
+    InfoV2Field('capture_seq', 'B', 1, True, ''),
+    InfoV2Field('data_output', 'B', 1, True, ''),
+    InfoV2Field('data_baud', 'I', 1, True, ''),
+    InfoV2Field('data_sensor_ip', 's', 4, True, 'ip'),
+    InfoV2Field('data_dest_ip', 's', 4, True, 'ip'),
+    InfoV2Field('data_subnet', 's', 4, True, 'ip'),
+    InfoV2Field('data_gateway', 's', 4, True, 'ip'),
+    InfoV2Field('data_port', 'H', 1, True, ''),
+    InfoV2Field('data_mac_addr', 's', 6, True, 'mac'),
+    InfoV2Field('sync', 'B', 1, True, ''),
+    InfoV2Field('sync_trig_delay_us', 'I', 1, True, ''),
+    InfoV2Field('sync_ill_delay_us', 'H', 15, True, ''),
+    InfoV2Field('sync_trig_trim_us', 'B', 1, True, ''),
+    InfoV2Field('sync_ill_trim_us', 'B', 1, True, ''),
+    InfoV2Field('sync_output_delay_us', 'H', 1, True, ''),
+    InfoV2Field('arb', 'B', 1, True, ''),
+    InfoV2Field('arb_timeout', 'I', 1, True, ''),
+    InfoV2Field('lock', 'B', 1, False, ''),    # This flag is not written in the info packet
+]
+INFO_V2_SIZE = 166
+INFO_V2_FIELDS = {field.name: field for field in INFO_V2_LAYOUT}
+
+# Sensor parameters (printed and compared), the writable fields except the serial number
+INFO_V2_PARAMS = [field.name for field in INFO_V2_LAYOUT if field.writable and field.name != 'sensor_sn']
+
+# struct and NumPy views of the same layout
+INFO_V2_STRUCT = struct.Struct('<' + ''.join(f"{field.count}{field.kind}" for field in INFO_V2_LAYOUT))
+INFO_V2_DTYPE = np.dtype([(field.name, {'B': 'u1', 'H': '<u2', 'I': '<u4', 's': 'u1'}[field.kind], (field.count,) if field.kind == 's' or field.count > 1 else ())
+                          for field in INFO_V2_LAYOUT])
+_INFO_V2_MASKS = {'B': 0xFF, 'H': 0xFFFF, 'I': 0xFFFFFFFF}
+
+# Decode steps: (name, 0, value index, 0) for scalars, (name, 1, first, end value index) for lists
+# and (name, 2, first, end byte offset) for raw bytes, which are sliced from the source buffer
+_INFO_V2_DECODE = []
+_index = 0
+_offset = 0
+for _field in INFO_V2_LAYOUT:
+    _size = struct.calcsize(f"<{_field.count}{_field.kind}")
+    if _field.kind == 's':
+        _INFO_V2_DECODE.append((_field.name, 2, _offset, _offset + _size))
+        _index += 1
+    elif _field.count == 1:
+        _INFO_V2_DECODE.append((_field.name, 0, _index, 0))
+        _index += 1
+    else:
+        _INFO_V2_DECODE.append((_field.name, 1, _index, _index + _field.count))
+        _index += _field.count
+    _offset += _size
+del _index, _offset, _size, _field
+
+if INFO_V2_STRUCT.size != INFO_V2_SIZE or INFO_V2_DTYPE.itemsize != INFO_V2_SIZE:
+    raise ImportError("Invalid info_v2 layout")
+
 # Encode function of info_2 packet for F/W V1.5.0+
 def encode_info_v2(src):
-    dst = bytearray(166)  # 166-byte array
-
-    # Sensor serial number (16-bit)
-    dst[0] = src['sensor_sn'] % 256
-    dst[1] = src['sensor_sn'] // 256
-
-    # Fill bytes 2 to 68 with 0 (Read only in original code)
-    for i in range(2, 70):
-        dst[i] = 0
-
-    # Capture mode and capture row (8-bit values)
-    dst[71] = src['capture_mode']
-    dst[72] = src['capture_row']
-
-    # Capture shutter (16-bit values, total 5 elements)
-    for i in range(5):
-        dst[73 + i * 2] = (src['capture_shutter'][i] >> 0) & 0xFF
-        dst[74 + i * 2] = (src['capture_shutter'][i] >> 8) & 0xFF
-
-    # Capture limit (16-bit values, total 2 elements)
-    dst[83] = (src['capture_limit'][0] >> 0) & 0xFF
-    dst[84] = (src['capture_limit'][0] >> 8) & 0xFF
-    dst[85] = (src['capture_limit'][1] >> 0) & 0xFF
-    dst[86] = (src['capture_limit'][1] >> 8) & 0xFF
-
-    # Capture period (32-bit value)
-    dst[87] = (src['capture_period_us'] >> 0) & 0xFF
-    dst[88] = (src['capture_period_us'] >> 8) & 0xFF
-    dst[89] = (src['capture_period_us'] >> 16) & 0xFF
-    dst[90] = (src['capture_period_us'] >> 24) & 0xFF
-
-    # Capture sequence (8-bit value)
-    dst[91] = src['capture_seq']
-
-    # Data output and baud rate (32-bit value)
-    dst[92] = src['data_output']
-    dst[93] = (src['data_baud'] >> 0) & 0xFF
-    dst[94] = (src['data_baud'] >> 8) & 0xFF
-    dst[95] = (src['data_baud'] >> 16) & 0xFF
-    dst[96] = (src['data_baud'] >> 24) & 0xFF
-
-    # Sensor and destination IP addresses (each 4 bytes)
-    dst[97:101] = src['data_sensor_ip']
-    dst[101:105] = src['data_dest_ip']
-    dst[105:109] = src['data_subnet']
-    dst[109:113] = src['data_gateway']
-
-    # Data port (16-bit value)
-    dst[113] = (src['data_port'] >> 0) & 0xFF
-    dst[114] = (src['data_port'] >> 8) & 0xFF
-
-    # MAC address (6 bytes)
-    dst[115:121] = src['data_mac_addr']
-
-    # Sync configuration
-    dst[121] = src['sync']
-    dst[122] = (src['sync_trig_delay_us'] >> 0) & 0xFF
-    dst[123] = (src['sync_trig_delay_us'] >> 8) & 0xFF
-    dst[124] = (src['sync_trig_delay_us'] >> 16) & 0xFF
-    dst[125] = (src['sync_trig_delay_us'] >> 24) & 0xFF
-
-    # Sync illumination delay (16-bit values, total 15 elements)
-    for i in range(15):
-        dst[126 + i * 2] = (src['sync_ill_delay_us'][i] >> 0) & 0xFF
-        dst[127 + i * 2] = (src['sync_ill_delay_us'][i] >> 8) & 0xFF
-
-    # Sync trimmer values (8-bit)
-    dst[156] = src['sync_trig_trim_us']
-    dst[157] = src['sync_ill_trim_us']
-
-    # Sync output delay (16-bit)
-    dst[158] = (src['sync_output_delay_us'] >> 0) & 0xFF
-    dst[159] = (src['sync_output_delay_us'] >> 8) & 0xFF
-
-    # Arbitration settings (8-bit and 32-bit)
-    dst[160] = src['arb']
-    dst[161] = (src['arb_timeout'] >> 0) & 0xFF
-    dst[162] = (src['arb_timeout'] >> 8) & 0xFF
-    dst[163] = (src['arb_timeout'] >> 16) & 0xFF
-    dst[164] = (src['arb_timeout'] >> 24) & 0xFF
-
-    # Additional flag
-    dst[165] = 0  # This flag is not written in the info packet
-
-    return dst
+    values = []
+    for field in INFO_V2_LAYOUT:
+        if field.kind == 's':
+            values.append(bytes(src[field.name]) if field.writable else b'')
+        elif not field.writable:
+            values.extend([0] * field.count)
+        elif field.count == 1:
+            values.append(src[field.name] & _INFO_V2_MASKS[field.kind])
+        else:
+            mask = _INFO_V2_MASKS[field.kind]
+            values.extend(value & mask for value in src[field.name][:field.count])
+    return bytearray(INFO_V2_STRUCT.pack(*values))
 
 # Decode function of info_v2 packet for F/W V1.5.0+
 def decode_info_v2(src):
-    # Initialize the output dictionary
+    if not isinstance(src, bytearray):
+        src = bytearray(src)
+    values = INFO_V2_STRUCT.unpack_from(src)
     dst = {}
     dst['ilidar_version'] = "1.5.X"
+    for name, step, first, end in _INFO_V2_DECODE:
+        if step == 0:
+            dst[name] = values[first]
+        elif step == 1:
+            dst[name] = list(values[first:end])
+        else:
+            dst[name] = src[first:end]
+    return dst
 
-    # Sensor serial number (16-bit)
-    dst['sensor_sn'] = (src[1] << 8) | src[0]
-
-    # Sensor HW ID (30 bytes)
-    dst['sensor_hw_id'] = src[2:32]
-
-    # Sensor FW version (3 bytes)
-    dst['sensor_fw_ver'] = src[32:35]
-
-    # Sensor FW date (12 bytes)
-    dst['sensor_fw_date'] = src[35:47]
-
-    # Sensor FW time (9 bytes)
-    dst['sensor_fw_time'] = src[47:56]
-
-    # Sensor calibration ID (32-bit)
-    dst['sensor_calib_id'] = (src[59] << 24) | (src[58] << 16) | (src[57] << 8) | src[56]
-
-    # Sensor firmware versions (3 bytes each)
-    dst['sensor_fw0_ver'] = src[60:63]
-    dst['sensor_fw1_ver'] = src[63:66]
-    dst['sensor_fw2_ver'] = src[66:69]
-
-    # Sensor model and boot control (8-bit values)
-    dst['sensor_model_id'] = src[69]
-    dst['sensor_boot_ctrl'] = src[70]
-
-    # Capture mode and row (8-bit)
-    dst['capture_mode'] = src[71]
-    dst['capture_row'] = src[72]
-
-    # Capture shutter (16-bit values, total 5 elements)
-    dst['capture_shutter'] = [
-        (src[74] << 8) | src[73],
-        (src[76] << 8) | src[75],
-        (src[78] << 8) | src[77],
-        (src[80] << 8) | src[79],
-        (src[82] << 8) | src[81]
-    ]
-
-    # Capture limit (16-bit values, total 2 elements)
-    dst['capture_limit'] = [
-        (src[84] << 8) | src[83],
-        (src[86] << 8) | src[85]
-    ]
-
-    # Capture period (32-bit value)
-    dst['capture_period_us'] = (src[90] << 24) | (src[89] << 16) | (src[88] << 8) | src[87]
-
-    # Capture sequence (8-bit value)
-    dst['capture_seq'] = src[91]
-
-    # Data output (8-bit value)
-    dst['data_output'] = src[92]
-
-    # Data baud rate (32-bit value)
-    dst['data_baud'] = (src[96] << 24) | (src[95] << 16) | (src[94] << 8) | src[93]
-
-    # Sensor and destination IP addresses (4 bytes each)
-    dst['data_sensor_ip'] = src[97:101]
-    dst['data_dest_ip'] = src[101:105]
-    dst['data_subnet'] = src[105:109]
-    dst['data_gateway'] = src[109:113]
-
-    # Data port (16-bit value)
-    dst['data_port'] = (src[114] << 8) | src[113]
-
-    # Data MAC address (6 bytes)
-    dst['data_mac_addr'] = src[115:121]
-
-    # Sync settings (8-bit and 32-bit values)
-    dst['sync'] = src[121]
-    dst['sync_trig_delay_us'] = (src[125] << 24) | (src[124] << 16) | (src[123] << 8) | src[122]
-
-    # Sync illumination delay (16-bit values, total 15 elements)
-    dst['sync_ill_delay_us'] = [
-        (src[127] << 8) | src[126],
-        (src[129] << 8) | src[128],
-        (src[131] << 8) | src[130],
-        (src[133] << 8) | src[132],
-        (src[135] << 8) | src[134],
-        (src[137] << 8) | src[136],
-        (src[139] << 8) | src[138],
-        (src[141] << 8) | src[140],
-        (src[143] << 8) | src[142],
-        (src[145] << 8) | src[144],
-        (src[147] << 8) | src[146],
-        (src[149] << 8) | src[148],
-        (src[151] << 8) | src[150],
-        (src[153] << 8) | src[152],
-        (src[155] << 8) | src[154]
-    ]
-
-    # Sync trim and delay (8-bit and 16-bit values)
-    dst['sync_trig_trim_us'] = src[156]
-    dst['sync_ill_trim_us'] = src[157]
-    dst['sync_output_delay_us'] = (src[159] << 8) | src[158]
-
-    # Arbitration (8-bit and 32-bit values)
-    dst['arb'] = src[160]
-    dst['arb_timeout'] = (src[164] << 24) | (src[163] << 16) | (src[162] << 8) | src[161]
-
-    # Lock (8-bit value)
-    dst['lock'] = src[165]
-
+# Decode many info_v2 blocks at once (zero-copy structured array of shape (N,))
+def decode_info_v2_batch(src):
+    return np.frombuffer(src, dtype=INFO_V2_DTYPE)
+
+# Encode many parameter sets (list of dicts or structured array) into a structured array of shape (N,)
+# Use `.tobytes()` on the result to get the concatenated 166-byte blocks.
+def encode_info_v2_batch(src):
+    dst = np.zeros(len(src), dtype=INFO_V2_DTYPE)
+    for field in INFO_V2_LAYOUT:
+        if not field.writable:
+            continue
+        if isinstance(src, np.ndarray):
+            dst[field.name] = src[field.name]
+        elif field.kind == 's':
+            dst[field.name] = np.frombuffer(b''.join(bytes(params[field.name]) for params in src), dtype=np.uint8).reshape(len(src), field.count)
+        else:
+            values = np.array([params[field.name] for params in src], dtype=np.int64)
+            dst[field.name] = values & _INFO_V2_MASKS[field.kind]
     return dst
 
+# Compare two sets of info_v2 blocks field by field (structured arrays of the same shape)
+# Returns {name: bool array}, True where the field differs.
+def diff_info_v2_batch(pri, post, names=None):
+    if names is None:
+        names = INFO_V2_PARAMS
+    diff = {}
+    for name in names:
+        changed = pri[name] != post[name]
+        if changed.ndim > 1:
+            changed = changed.any(axis=tuple(range(1, changed.ndim)))
+        diff[name] = changed
+    return diff
+
+# Normalized value of a field for comparison
+def _info_v2_value(field, value):
+    if field.kind == 's':
+        return bytes(value)
+    if field.count > 1:
+        return list(value)
+    return value
+
+# Names of the parameters that differ between two parameter sets (dicts or InfoV2)
+def diff_info_v2(pri, post, names=None):
+    if names is None:
+        names = INFO_V2_PARAMS
+    changed = []
+    for name in names:
+        field = INFO_V2_FIELDS[name]
+        if _info_v2_value(field, pri[name]) != _info_v2_value(field, post[name]):
+            changed.append(name)
+    return changed
+
+# Printable value of a field
+def format_info_v2(name, value):
+    fmt = INFO_V2_FIELDS[name].fmt
+    if fmt == 'ip':
+        return f"{value[0]}.{value[1]}.{value[2]}.{value[3]}"
+    if fmt == 'mac':
+        return f"{value[0]}:{value[1]}:{value[2]}_{value[3]}:{value[4]}:{value[5]}"
+    return f"{value}"
+
+# Typed view of a 166-byte info_v2 block
+# Decoding only wraps the buffer: fields are read from (and written to) the buffer on access.
+# Supports dict-style access, so it can be used wherever a decoded params dict is expected.
+class InfoV2:
+    __slots__ = ('buffer', '_view')
+
+    def __init__(self, buffer=None):
+        if buffer is None:
+            buffer = bytearray(INFO_V2_SIZE)
+        self.buffer = buffer
+        self._view = np.ndarray((), dtype=INFO_V2_DTYPE, buffer=buffer)
+
+    # View of the i-th block of a buffer holding many blocks
+    @classmethod
+    def at(cls, buffer, i):
+        return cls(memoryview(buffer)[i * INFO_V2_SIZE:(i + 1) * INFO_V2_SIZE])
+
+    def __getitem__(self, name):
+        if name == 'ilidar_version':
+            return "1.5.X"
+        field = INFO_V2_FIELDS[name]
+        value = self._view[name]
+        if field.kind == 's':
+            return bytearray(value.tobytes())
+        if field.count > 1:
+            return value.tolist()
+        return int(value)
+
+    def __setitem__(self, name, value):
+        field = INFO_V2_FIELDS[name]
+        if field.kind == 's':
+            value = np.frombuffer(bytes(value), dtype=np.uint8)
+        self._view[name] = value
+
+    def __eq__(self, other):
+        return isinstance(other, InfoV2) and bytes(self.buffer) == bytes(other.buffer)
+
+    def keys(self):
+        return ['ilidar_version'] + list(INFO_V2_FIELDS)
+
+    def copy(self):
+        return InfoV2(bytearray(self.buffer))
+
+    # Decoded params dict (same as decode_info_v2)
+    def to_dict(self):
+        return decode_info_v2(self.buffer)
+
+    # Names of the parameters that differ from another parameter set
+    def diff(self, other, names=None):
+        return diff_info_v2(self, other, names)
+
+# Attribute access for every field (params.capture_mode, ...)
+def _info_v2_property(name):
+    return property(lambda self: self[name], lambda self, value: self.__setitem__(name, value))
+
+for _field in INFO_V2_LAYOUT:
+    setattr(InfoV2, _field.name, _info_v2_property(_field.name))
+del _field
+
 # Print function of info_v2 packet for F/W V1.5.0+
 def print_info_v2(src):
-    print(f"  sensor_sn: {src['sensor_sn']}")
-    print(f"  capture_mode: {src['capture_mode']}")
-    print(f"  capture_row: {src['capture_row']}")
-    print(f"  capture_shutter: {src['capture_shutter']}")
-    print(f"  capture_limit: {src['capture_limit']}")
-    print(f"  capture_period_us: {src['capture_period_us']}")
-    print(f"  capture_seq: {src['capture_seq']}")
-    print(f"  data_output: {src['data_output']}")
-    print(f"  data_baud: {src['data_baud']}")
-    data_sensor_ip = src['data_sensor_ip']
-    print(f"  data_sensor_ip: {data_sensor_ip[0]}.{data_sensor_ip[1]}.{data_sensor_ip[2]}.{data_sensor_ip[3]}")
-    data_dest_ip = src['data_dest_ip']
-    print(f"  data_dest_ip: {data_dest_ip[0]}.{data_dest_ip[1]}.{data_dest_ip[2]}.{data_dest_ip[3]}")
-    data_subnet = src['data_subnet']
-    print(f"  data_subnet: {data_subnet[0]}.{data_subnet[1]}.{data_subnet[2]}.{data_subnet[3]}")
-    data_gateway = src['data_gateway']
-    print(f"  data_gateway: {data_gateway[0]}.{data_gateway[1]}.{data_gateway[2]}.{data_gateway[3]}")
-    print(f"  data_port: {src['data_port']}")
-    data_mac_addr = src['data_mac_addr']
-    print(f"  data_mac_addr: {data_mac_addr[0]}:{data_mac_addr[1]}:{data_mac_addr[2]}_{data_mac_addr[3]}:{data_mac_addr[4]}:{data_mac_addr[5]}")
-    print(f"  sync: {src['sync']}")
-    print(f"  sync_trig_delay_us: {src['sync_trig_delay_us']}")
-    print(f"  sync_ill_delay_us: {src['sync_ill_delay_us']}")
-    print(f"  sync_trig_trim_us: {src['sync_trig_trim_us']}")
-    print(f"  sync_ill_trim_us: {src['sync_ill_trim_us']}")
-    print(f"  sync_output_delay_us: {src['sync_output_delay_us']}")
-    print(f"  arb: {src['arb']}")
-    print(f"  arb_timeout: {src['arb_timeout']}")
+    for name in ['sensor_sn'] + INFO_V2_PARAMS:
+        print(f"  {name}: {format_info_v2(name, src[name])}")
 
 # Print function of changed parameters for for F/W V1.4.0+
 def print_diff_info_v2(pri, post):
-    diff = 0
+    changed = diff_info_v2(pri, post)
+    for name in changed:
+        print(f"  {name}: {format_info_v2(name, pri[name])}")
+        print(f"{' ' * len(name)}--> {format_info_v2(name, post[name])}")
+    return len(changed)
+
+# Native frame buffer layout: depth in rows [0, 160), intensity in rows [160, 320)
+FRAME_MAX_ROWS = 160
+FRAME_COLS = 320
+INTRINSIC_CENTER_ROW = 120
+
+# Frame layout of the active readout (`capture_row` rows of depth and intensity)
+# The native buffer stays 320x320, `view()` gives the (2, rows, cols) part that holds data and the frame ring
+# stores it as a compact (2 * rows, cols) frame: depth in [0, rows), intensity in [rows, 2 * rows).
+# The intrinsic crop is the `rows` rows centered on the optical center (row 120 of 240).
+# `intensity_offset` is the first intensity row in the native buffer.
+class FrameLayout:
+    def __init__(self, rows=FRAME_MAX_ROWS, cols=FRAME_COLS, intensity_offset=FRAME_MAX_ROWS):
+        if rows < 1 or rows > FRAME_MAX_ROWS:
+            raise ValueError(f"Unsupported number of rows: {rows}")
+        self.rows = rows
+        self.cols = cols
+        self.intensity_offset = intensity_offset
+        self.frame_shape = (2 * rows, cols)
+        self.n_points = rows * cols
+        start = INTRINSIC_CENTER_ROW - rows // 2
+        self.crop = (start, start + rows)
+
+    # Layout of info_v2 parameters (dict or InfoV2), None if they do not hold a usable capture_row
+    @classmethod
+    def from_params(cls, params, intensity_offset=FRAME_MAX_ROWS):
+        rows = int(params['capture_row'])
+        if rows < 1 or rows > FRAME_MAX_ROWS:
+            return None
+        return cls(rows, FRAME_COLS, intensity_offset)
+
+    def __eq__(self, other):
+        return isinstance(other, FrameLayout) and (self.rows, self.cols, self.intensity_offset) == (other.rows, other.cols, other.intensity_offset)
+
+    def __repr__(self):
+        return f"FrameLayout(rows={self.rows}, cols={self.cols}, crop={self.crop})"
+
+    # (2, rows, cols) view of the rows of the native buffer that hold data
+    def view(self, img):
+        stride = img.strides[0]
+        return np.lib.stride_tricks.as_strided(img, (2, self.rows, self.cols), (self.intensity_offset * stride, stride, img.strides[1]), writeable=False)
+
+    # Depth and intensity images of a compact frame
+    def depth(self, frame):
+        return frame[:self.rows]
+
+    def intensity(self, frame):
+        return frame[self.rows:2 * self.rows]
+
+    # Shared intrinsic table (rotated and scaled) of a sensor model for this layout
+    def intrinsic(self, model, rotate=True, scale=0.001, registry=None):
+        if registry is None:
+            registry = intrinsic_registry
+        return registry.get(model, self.crop, rotate=rotate, scale=scale)
+
+# Frame ring policies
+RING_POLICY_BLOCK = 'block'               # Producer waits (up to block_timeout) for the consumer to free a slot
+RING_POLICY_LATEST = 'latest'             # Consumer always receives the newest frame, older unread frames are skipped
+RING_POLICY_DROP_OLDEST = 'drop_oldest'   # Producer overwrites the oldest unread frame when the ring is full
+RING_POLICIES = (RING_POLICY_BLOCK, RING_POLICY_LATEST, RING_POLICY_DROP_OLDEST)
+
+# Multi-slot frame ring with preallocated slots
+# The producer (sensor callback) copies each frame into the next slot with a sequence number and a host timestamp.
+# The consumer copies frames out under the same lock, so it never sees a frame that is being overwritten.
+class FrameRing:
+    def __init__(self, n_slots=8, shape=(320, 320), dtype=np.uint16, policy=RING_POLICY_DROP_OLDEST, block_timeout=0.005):
+        if n_slots < 2:
+            raise ValueError("FrameRing needs at least 2 slots")
+        if policy not in RING_POLICIES:
+            raise ValueError(f"Unknown ring policy: {policy}")
+
+        self.n_slots = n_slots
+        self.shape = tuple(shape)
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # Preallocated storage, no allocation per frame
+        self.slots = np.zeros((n_slots,) + self.shape, dtype=dtype)
+        self.seqs = np.full(n_slots, -1, dtype=np.int64)
+        self.timestamps = np.zeros(n_slots, dtype=np.int64)
+        self._out = np.zeros(self.shape, dtype=dtype)
+
+        # Counters
+        self.write_count = 0    # Sequence number of the next pushed frame
+        self.read_count = 0     # Sequence number of the next frame to be read
+        self.overruns = 0       # Number of pushes that found the ring full
+        self.drops = 0          # Number of frames the consumer will never receive
+
+        # Optional LatencyHistogram of the time between push and get (consumer latency)
+        self.latency_histogram = None
+
+        # Optional FrameLayout applied to pushed native frames (set_layout())
+        self.layout = None
+
+        self._cond = threading.Condition()
+
+    # Copy a frame into the next slot (called from the sensor callback)
+    # Returns the sequence number of the stored frame or -1 if it was rejected
+    def push(self, frame, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+
+        with self._cond:
+            if self.write_count - self.read_count >= self.n_slots:
+                self.overruns += 1
+                if self.policy == RING_POLICY_BLOCK:
+                    if not self._cond.wait_for(lambda: self.write_count - self.read_count < self.n_slots, self.block_timeout):
+                        self.drops += 1
+                        return -1
+                else:
+                    # Drop the oldest unread frame
+                    self.read_count += 1
+                    self.drops += 1
+
+            seq = self.write_count
+            idx = seq % self.n_slots
+            if self.layout is not None:
+                frame = self.layout.view(frame)
+            np.copyto(self.slots[idx].reshape(frame.shape), frame, casting='unsafe')
+            self.seqs[idx] = seq
+            self.timestamps[idx] = timestamp_ns
+            self.write_count = seq + 1
+            self._cond.notify_all()
+
+        return seq
+
+    # Copy the next frame out of the ring
+    # Returns (seq, timestamp_ns, frame) or None on timeout. Without `out` the frame is copied into an
+    # internal buffer that is reused by the next call.
+    def get(self, timeout=None, out=None):
+        if out is None:
+            out = self._out
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.write_count > self.read_count, timeout):
+                return None
+
+            if self.policy == RING_POLICY_LATEST:
+                self.drops += self.write_count - 1 - self.read_count
+                self.read_count = self.write_count - 1
+
+            seq = self.read_count
+            idx = seq % self.n_slots
+            np.copyto(out, self.slots[idx])
+            timestamp_ns = int(self.timestamps[idx])
+            self.read_count = seq + 1
+            self._cond.notify_all()
+
+        if self.latency_histogram is not None:
+            self.latency_histogram.add(time.perf_counter_ns() - timestamp_ns)
+        return seq, timestamp_ns, out
+
+    # Store the compact frames of a layout from now on (frames already in the ring are discarded)
+    def set_layout(self, layout):
+        with self._cond:
+            self.layout = layout
+            self.shape = layout.frame_shape
+            self.slots = np.zeros((self.n_slots,) + self.shape, dtype=self.slots.dtype)
+            self._out = np.zeros(self.shape, dtype=self.slots.dtype)
+            self.drops += self.write_count - self.read_count
+            self.read_count = self.write_count
+            self._cond.notify_all()
+
+    # Number of frames waiting for the consumer
+    def pending(self):
+        with self._cond:
+            return self.write_count - self.read_count
+
+    # Discard all unread frames
+    def clear(self):
+        with self._cond:
+            self.drops += self.write_count - self.read_count
+            self.read_count = self.write_count
+            self._cond.notify_all()
+
+    # Counter snapshot
+    def stats(self):
+        with self._cond:
+            return {
+                'frames': self.write_count,
+                'pending': self.write_count - self.read_count,
+                'overruns': self.overruns,
+                'drops': self.drops,
+            }
+
+# Shared frame ring fan-out modes
+SHARED_FANOUT_BROADCAST = 'broadcast'       # Every worker receives every frame
+SHARED_FANOUT_ROUND_ROBIN = 'round_robin'   # Frame `seq` goes to worker seq % n_workers
+SHARED_FANOUTS = (SHARED_FANOUT_BROADCAST, SHARED_FANOUT_ROUND_ROBIN)
+
+# Shared frame ring header (int64 words)
+SHARED_MAGIC = 0x31474E5253465449       # b'ITFSRNG1'
+SHARED_HEADER_WORDS = 16
+SHARED_MAGIC_WORD = 0
+SHARED_N_SLOTS_WORD = 1
+SHARED_ROWS_WORD = 2
+SHARED_COLS_WORD = 3
+SHARED_N_WORKERS_WORD = 4
+SHARED_FANOUT_WORD = 5
+SHARED_POLICY_WORD = 6
+SHARED_WRITE_COUNT_WORD = 7             # Sequence number of the next pushed frame
+SHARED_CLOSED_WORD = 8                  # Set by the producer when no more frames will be pushed
+SHARED_OVERRUNS_WORD = 9                # Pushes that found the ring full (backpressure events)
+SHARED_DROPS_WORD = 10                  # Frames rejected by the producer (RING_POLICY_BLOCK)
+SHARED_BACKPRESSURE_WORD = 11           # 1 while the producer is waiting for a slot or dropping frames
+
+# Frame ring in shared memory for worker processes
+# Layout: int64 header, per-worker next sequence numbers and lost frame counts, per-slot sequence numbers and timestamps, then
+# the uint16 slots. The producer (sensor callback) copies each frame into a slot and publishes it by
+# writing the slot and ring sequence numbers last; workers attach by name and read zero-copy views.
+# A worker calls release() when it is done with a frame, which frees the slot for the producer.
+#   RING_POLICY_BLOCK       : the producer waits up to block_timeout for the slowest worker, then drops the new frame
+#   RING_POLICY_DROP_OLDEST : the producer overwrites unreleased frames, workers skip them (counted in `lost`)
+#   RING_POLICY_LATEST      : as DROP_OLDEST, and workers always jump to their newest frame
+class SharedFrameRing:
+    def __init__(self, n_slots=8, shape=(320, 320), n_workers=1, fanout=SHARED_FANOUT_BROADCAST, policy=RING_POLICY_BLOCK, block_timeout=0.005, name=None, _shm=None):
+        if _shm is None:
+            if n_slots < 2:
+                raise ValueError("SharedFrameRing needs at least 2 slots")
+            if n_workers < 1:
+                raise ValueError("SharedFrameRing needs at least 1 worker")
+            if fanout not in SHARED_FANOUTS:
+                raise ValueError(f"Unknown fan-out mode: {fanout}")
+            if policy not in RING_POLICIES:
+                raise ValueError(f"Unknown ring policy: {policy}")
+            rows, cols = shape
+            _shm = shared_memory.SharedMemory(name=name, create=True, size=SharedFrameRing.nbytes(n_slots, rows, cols, n_workers))
+            self.owner = True
+        else:
+            self.owner = False
+
+        self.shm = _shm
+        self.name = _shm.name
+        self.header = np.ndarray((SHARED_HEADER_WORDS,), dtype=np.int64, buffer=_shm.buf)
+        if self.owner:
+            self.header[:] = 0
+            self.header[SHARED_N_SLOTS_WORD] = n_slots
+            self.header[SHARED_ROWS_WORD] = rows
+            self.header[SHARED_COLS_WORD] = cols
+            self.header[SHARED_N_WORKERS_WORD] = n_workers
+            self.header[SHARED_FANOUT_WORD] = SHARED_FANOUTS.index(fanout)
+            self.header[SHARED_POLICY_WORD] = RING_POLICIES.index(policy)
+        elif self.header[SHARED_MAGIC_WORD] != SHARED_MAGIC:
+            raise ValueError(f"Not a shared frame ring: {self.name}")
+
+        self.n_slots = int(self.header[SHARED_N_SLOTS_WORD])
+        self.shape = (int(self.header[SHARED_ROWS_WORD]), int(self.header[SHARED_COLS_WORD]))
+        self.n_workers = int(self.header[SHARED_N_WORKERS_WORD])
+        self.fanout = SHARED_FANOUTS[self.header[SHARED_FANOUT_WORD]]
+        self.policy = RING_POLICIES[self.header[SHARED_POLICY_WORD]]
+        self.block_timeout = block_timeout
+        self.step = 1 if self.fanout == SHARED_FANOUT_BROADCAST else self.n_workers
+
+        # Views of the shared memory
+        offset = SHARED_HEADER_WORDS * 8
+        self.next_seqs = np.ndarray((self.n_workers,), dtype=np.int64, buffer=_shm.buf, offset=offset)
+        offset += self.n_workers * 8
+        self.lost = np.ndarray((self.n_workers,), dtype=np.int64, buffer=_shm.buf, offset=offset)
+        offset += self.n_workers * 8
+        self.seqs = np.ndarray((self.n_slots,), dtype=np.int64, buffer=_shm.buf, offset=offset)
+        offset += self.n_slots * 8
+        self.timestamps = np.ndarray((self.n_slots,), dtype=np.int64, buffer=_shm.buf, offset=offset)
+        offset += self.n_slots * 8
+        self.slots = np.ndarray((self.n_slots,) + self.shape, dtype=np.uint16, buffer=_shm.buf, offset=offset)
+
+        if self.owner:
+            self.seqs[:] = -1
+            self.lost[:] = 0
+            if self.fanout == SHARED_FANOUT_BROADCAST:
+                self.next_seqs[:] = 0
+            else:
+                self.next_seqs[:] = np.arange(self.n_workers)
+            # Publish the ring last
+            self.header[SHARED_MAGIC_WORD] = SHARED_MAGIC
+
+    # Size of the shared memory block
+    @staticmethod
+    def nbytes(n_slots, rows, cols, n_workers):
+        return (SHARED_HEADER_WORDS + 2 * n_workers + 2 * n_slots) * 8 + n_slots * rows * cols * 2
+
+    # Attach to an existing ring (in a worker process)
+    @classmethod
+    def attach(cls, name, block_timeout=0.005):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(block_timeout=block_timeout, _shm=shm)
+
+    # Whether the slot of sequence number `seq` has been released by every worker that reads it
+    def _released(self, seq):
+        if seq < 0:
+            return True
+        if self.fanout == SHARED_FANOUT_BROADCAST:
+            return self.next_seqs.min() > seq
+        return self.next_seqs[seq % self.n_workers] > seq
+
+    # Copy a frame into the next slot (called from the sensor callback)
+    # Returns the sequence number of the stored frame or -1 if it was rejected
+    def push(self, frame, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+
+        header = self.header
+        seq = int(header[SHARED_WRITE_COUNT_WORD])
+        if not self._released(seq - self.n_slots):
+            header[SHARED_OVERRUNS_WORD] += 1
+            header[SHARED_BACKPRESSURE_WORD] = 1
+            if self.policy == RING_POLICY_BLOCK:
+                _, released = poll_until(lambda: self._released(seq - self.n_slots), bool, self.block_timeout, 0.0001, 0.001)
+                if not released:
+                    header[SHARED_DROPS_WORD] += 1
+                    return -1
+        else:
+            header[SHARED_BACKPRESSURE_WORD] = 0
+
+        idx = seq % self.n_slots
+        self.seqs[idx] = -1
+        np.copyto(self.slots[idx], frame, casting='unsafe')
+        self.timestamps[idx] = timestamp_ns
+        self.seqs[idx] = seq
+        header[SHARED_WRITE_COUNT_WORD] = seq + 1
+        return seq
+
+    # Next frame of a worker as a zero-copy view of its slot
+    # Returns (seq, timestamp_ns, frame) or None on timeout or when the ring is closed and drained.
+    # The view stays valid until release(worker, seq) (RING_POLICY_BLOCK), see is_valid() otherwise.
+    def get(self, worker, timeout=None):
+        header = self.header
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        interval = 0.0001
+        while True:
+            seq = int(self.next_seqs[worker])
+            write_count = int(header[SHARED_WRITE_COUNT_WORD])
+            if seq < write_count:
+                # Skip frames that have been (or are about to be) overwritten
+                # With RING_POLICY_BLOCK the producer never reuses an unreleased slot, so nothing is skipped.
+                if self.policy == RING_POLICY_BLOCK:
+                    oldest = write_count - self.n_slots
+                elif self.policy == RING_POLICY_LATEST:
+                    oldest = write_count - 1
+                else:
+                    oldest = write_count - self.n_slots + 1
+                if seq < oldest:
+                    skip = -(-(oldest - seq) // self.step) * self.step
+                    self.lost[worker] += skip // self.step
+                    seq += skip
+                    self.next_seqs[worker] = seq
+                    continue
+
+                idx = seq % self.n_slots
+                timestamp_ns = int(self.timestamps[idx])
+                if self.seqs[idx] != seq:
+                    continue
+                return seq, timestamp_ns, self.slots[idx]
+
+            if header[SHARED_CLOSED_WORD]:
+                return None
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                interval = min(interval, remaining)
+            time.sleep(interval)
+            interval = min(interval * 2, 0.002)
+
+    # Release a frame returned by get(), its slot may be reused by the producer
+    def release(self, worker, seq):
+        self.next_seqs[worker] = seq + self.step
+
+    # Whether the slot of `seq` still holds that frame (check after processing without RING_POLICY_BLOCK)
+    def is_valid(self, seq):
+        return self.seqs[seq % self.n_slots] == seq
+
+    # Iterate over the frames of a worker until the ring is closed, releasing each frame after use
+    def frames(self, worker, timeout=None):
+        while True:
+            item = self.get(worker, timeout)
+            if item is None:
+                return
+            yield item
+            self.release(worker, item[0])
+
+    # Whether the producer is currently waiting for or dropping frames because of slow workers
+    @property
+    def backpressure(self):
+        return bool(self.header[SHARED_BACKPRESSURE_WORD])
+
+    # Mark the end of the stream, workers return from get() once they have drained their frames
+    def close_stream(self):
+        self.header[SHARED_CLOSED_WORD] = 1
+
+    # Detach from the shared memory (the owner also releases the block)
+    def close(self):
+        if self.owner:
+            self.close_stream()
+        self.header = None
+        self.next_seqs = None
+        self.lost = None
+        self.seqs = None
+        self.timestamps = None
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Counter snapshot
+    def stats(self):
+        write_count = int(self.header[SHARED_WRITE_COUNT_WORD])
+        return {
+            'name': self.name,
+            'frames': write_count,
+            'overruns': int(self.header[SHARED_OVERRUNS_WORD]),
+            'drops': int(self.header[SHARED_DROPS_WORD]),
+            'backpressure': self.backpressure,
+            'lag': [max(write_count - int(seq), 0) for seq in self.next_seqs],
+            'lost': [int(lost) for lost in self.lost],
+        }
+
+# Worker process entry point of a SharedFrameRing
+# Calls func(seq, timestamp_ns, frame) for every frame of `worker` until the ring is closed. Use as
+#   multiprocessing.Process(target=run_shared_worker, args=(ring.name, worker, func))
+# with a module-level `func`.
+def run_shared_worker(name, worker, func, timeout=None):
+    ring = SharedFrameRing.attach(name)
+    try:
+        for seq, timestamp_ns, frame in ring.frames(worker, timeout):
+            func(seq, timestamp_ns, frame)
+    finally:
+        ring.close()
+
+# Intrinsic vector table layout (iTFS-110.dat, iTFS-80.dat)
+INTRINSIC_SHAPE = (240, 320, 3)
+INTRINSIC_DEFAULT_CROP = (40, 200)
+
+# Rotate intrinsic vectors to X-front, Y-left, and Z-up Cartesian coordinates and apply a scale
+def rotate_intrinsic(vec, scale=1.0):
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1, 3)
+    dst = np.empty((vec.shape[0], 3), dtype=np.float32)
+    np.multiply(vec[:, 2], scale, out=dst[:, 0])
+    np.multiply(vec[:, 0], -scale, out=dst[:, 1])
+    np.multiply(vec[:, 1], -scale, out=dst[:, 2])
+    return dst
 
-    if pri['capture_mode'] != post['capture_mode']:
-        diff += 1
-        print(f"  capture_mode: {pri['capture_mode']}")
-        print(f"            --> {post['capture_mode']}")
-        
-    if pri['capture_row'] != post['capture_row']:
-        diff += 1
-        print(f"  capture_row: {pri['capture_row']}")
-        print(f"           --> {post['capture_row']}")
-        
-    if pri['capture_shutter'] != post['capture_shutter']:
-        diff += 1
-        print(f"  capture_shutter: {pri['capture_shutter']}")
-        print(f"               --> {post['capture_shutter']}")
-        
-    if pri['capture_limit'] != post['capture_limit']:
-        diff += 1
-        print(f"  capture_limit: {pri['capture_limit']}")
-        print(f"             --> {post['capture_limit']}")
-        
-    if pri['capture_period_us'] != post['capture_period_us']:
-        diff += 1
-        print(f"  capture_period_us: {pri['capture_period_us']}")
-        print(f"                 --> {post['capture_period_us']}")
-        
-    if pri['capture_seq'] != post['capture_seq']:
-        diff += 1
-        print(f"  capture_seq: {pri['capture_seq']}")
-        print(f"           --> {post['capture_seq']}")
-        
-    if pri['data_output'] != post['data_output']:
-        diff += 1
-        print(f"  data_output: {pri['data_output']}")
-        print(f"           --> {post['data_output']}")
-        
-    if pri['data_baud'] != post['data_baud']:
-        diff += 1
-        print(f"  data_baud: {pri['data_baud']}")
-        print(f"         --> {post['data_baud']}")
-        
-    if pri['data_sensor_ip'] != bytearray(post['data_sensor_ip']):
-        diff += 1
-        arr = pri['data_sensor_ip']
-        print(f"  data_sensor_ip: {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        arr = post['data_sensor_ip']
-        print(f"              --> {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        
-    if pri['data_dest_ip'] != bytearray(post['data_dest_ip']):
-        diff += 1
-        arr = pri['data_dest_ip']
-        print(f"  data_dest_ip: {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        arr = post['data_dest_ip']
-        print(f"            --> {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        
-    if pri['data_subnet'] != bytearray(post['data_subnet']):
-        diff += 1
-        arr = pri['data_subnet']
-        print(f"  data_subnet: {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        arr = post['data_subnet']
-        print(f"           --> {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        
-    if pri['data_gateway'] != bytearray(post['data_gateway']):
-        diff += 1
-        arr = pri['data_gateway']
-        print(f"  data_gateway: {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        arr = post['data_gateway']
-        print(f"            --> {arr[0]}.{arr[1]}.{arr[2]}.{arr[3]}")
-        
-    if pri['data_port'] != post['data_port']:
-        diff += 1
-        print(f"  data_port: {pri['data_port']}")
-        print(f"         --> {post['data_port']}")
-        
-    if pri['data_mac_addr'] != bytearray(post['data_mac_addr']):
-        diff += 1
-        arr = pri['data_mac_addr']
-        print(f"  data_mac_addr: {arr[0]}:{arr[1]}:{arr[2]}_{arr[3]}:{arr[4]}:{arr[5]}")
-        arr = post['data_mac_addr']
-        print(f"             --> {arr[0]}:{arr[1]}:{arr[2]}_{arr[3]}:{arr[4]}:{arr[5]}")
-        
-    if pri['sync'] != post['sync']:
-        diff += 1
-        print(f"  sync: {pri['sync']}")
-        print(f"    --> {post['sync']}")
-        
-    if pri['sync_trig_delay_us'] != post['sync_trig_delay_us']:
-        diff += 1
-        print(f"  sync_trig_delay_us: {pri['sync_trig_delay_us']}")
-        print(f"                  --> {post['sync_trig_delay_us']}")
-        
-    if pri['sync_ill_delay_us'] != post['sync_ill_delay_us']:
-        diff += 1
-        print(f"  sync_ill_delay_us: {pri['sync_ill_delay_us']}")
-        print(f"                 --> {post['sync_ill_delay_us']}")
-        
-    if pri['sync_trig_trim_us'] != post['sync_trig_trim_us']:
-        diff += 1
-        print(f"  sync_trig_trim_us: {pri['sync_trig_trim_us']}")
-        print(f"                 --> {post['sync_trig_trim_us']}")
-        
-    if pri['sync_ill_trim_us'] != post['sync_ill_trim_us']:
-        diff += 1
-        print(f"  sync_ill_trim_us: {pri['sync_ill_trim_us']}")
-        print(f"                --> {post['sync_ill_trim_us']}")
-        
-    if pri['sync_output_delay_us'] != post['sync_output_delay_us']:
-        diff += 1
-        print(f"  sync_output_delay_us: {pri['sync_output_delay_us']}")
-        print(f"                    --> {post['sync_output_delay_us']}")
-        
-    if pri['arb'] != post['arb']:
-        diff += 1
-        print(f"  arb: {pri['arb']}")
-        print(f"   --> {post['arb']}")
-        
-    if pri['arb_timeout'] != post['arb_timeout']:
-        diff += 1
-        print(f"  arb_timeout: {pri['arb_timeout']}")
-        print(f"           --> {post['arb_timeout']}")
+# Registry of intrinsic tables per sensor model
+# Each .dat file is memory-mapped read-only once and shared by every sensor of the same model.
+# Derived variants (cropped, rotated, scaled) are cached with LRU eviction and returned read-only.
+class IntrinsicRegistry:
+    def __init__(self, data_dir=None, max_variants=16):
+        if data_dir is None:
+            data_dir = os.path.dirname(os.path.abspath(__file__))
+        self.data_dir = data_dir
+        self.max_variants = max_variants
+
+        self.hits = 0
+        self.misses = 0
+        self._maps = {}
+        self._variants = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # Path of the intrinsic file of a model (110 or 80)
+    def path(self, model):
+        return os.path.join(self.data_dir, f"iTFS-{int(model)}.dat")
+
+    # Shared read-only mapping of an intrinsic file
+    def map_file(self, file_path):
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            vec = self._maps.get(file_path)
+            if vec is None:
+                vec = np.memmap(file_path, dtype=np.float32, mode='r', shape=INTRINSIC_SHAPE)
+                self._maps[file_path] = vec
+            return vec
+
+    # Shared read-only mapping of a model
+    def mapping(self, model):
+        return self.map_file(self.path(model))
+
+    # Intrinsic table of a model for the given crop window (rows)
+    # Without rotation and scale the result is a view of the shared mapping, otherwise a cached
+    # float32 table of shape (rows * 320, 3).
+    def get(self, model, crop=INTRINSIC_DEFAULT_CROP, rotate=False, scale=1.0):
+        key = (int(model), int(crop[0]), int(crop[1]), bool(rotate), float(scale))
+        with self._lock:
+            vec = self._variants.get(key)
+            if vec is not None:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return vec
+            self.misses += 1
+
+        vec = self.mapping(model)[key[1]:key[2], :, :]
+        if rotate:
+            vec = rotate_intrinsic(vec, scale)
+        elif scale != 1.0:
+            vec = np.multiply(vec, np.float32(scale))
+        vec.flags.writeable = False
+
+        with self._lock:
+            self._variants[key] = vec
+            self._variants.move_to_end(key)
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+        return vec
+
+    # Drop the cached variants (mappings are kept)
+    def clear(self):
+        with self._lock:
+            self._variants.clear()
+
+    # Cache statistics
+    def stats(self):
+        with self._lock:
+            return {
+                'mappings': len(self._maps),
+                'variants': len(self._variants),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+# Default registry (intrinsic files next to this script)
+intrinsic_registry = IntrinsicRegistry()
+
+# Get the intrinsic table of a model from the default registry
+def get_intrinsic(model, crop=INTRINSIC_DEFAULT_CROP, rotate=False, scale=1.0):
+    return intrinsic_registry.get(model, crop, rotate, scale)
+
+# Read 3D reconstruction vectors from the file
+# The file is memory-mapped once and the returned array is a read-only view of rows 40:200
+def read_intrinsic(file_path, crop=INTRINSIC_DEFAULT_CROP):
+    vec = intrinsic_registry.map_file(file_path)
+    return vec[crop[0]:crop[1], :, :]
+
+# Depth-to-point-cloud reconstruction with a precomputed ray table
+# The axis rotation (X-front, Y-left, Z-up) and the mm-to-m scale are baked into a contiguous float32 table
+# once, so each frame costs a single multiply into a reused output buffer.
+class PointCloudReconstructor:
+    def __init__(self, vec=None, scale=0.001, lut=None):
+        # Rotate the vectors to X-front, Y-left, and Z-up Cartesian coordinates
+        # A prepared (rotated and scaled) table can be shared through `lut`
+        if lut is None:
+            lut = rotate_intrinsic(vec, scale)
+        self.lut = lut
+        self.n_points = lut.shape[0]
+        self.scale = scale
+
+        # Pooled output buffers
+        self.points = np.zeros((self.n_points, 3), dtype=np.float32)
+        self.valid_points = np.zeros((self.n_points, 3), dtype=np.float32)
+
+        # Precomputed index path for valid points
+        self._index = np.arange(self.n_points, dtype=np.intp)
+        self._mask = np.zeros(self.n_points, dtype=bool)
+        self._valid_index = np.zeros(self.n_points, dtype=np.intp)
+        self._valid_depth = np.zeros(self.n_points, dtype=np.uint16)
+        self.index = self._valid_index[:0]
+
+    # Create from an intrinsic vector file (iTFS-110.dat or iTFS-80.dat)
+    @classmethod
+    def from_file(cls, file_path, scale=0.001, crop=INTRINSIC_DEFAULT_CROP):
+        return cls(read_intrinsic(file_path, crop), scale)
+
+    # Create from the shared intrinsic table of a model (110 or 80)
+    @classmethod
+    def from_model(cls, model, crop=INTRINSIC_DEFAULT_CROP, scale=0.001, registry=None):
+        if registry is None:
+            registry = intrinsic_registry
+        return cls(scale=scale, lut=registry.get(model, crop, rotate=True, scale=scale))
+
+    # Reconstruct all points (zero-depth pixels become the origin)
+    # Without `out` the points are written into the pooled buffer `self.points`
+    def reconstruct(self, depth, out=None):
+        if out is None:
+            out = self.points
+        np.multiply(self.lut, depth.reshape(-1, 1), out=out)
+        return out
+
+    # Reconstruct only the pixels with non-zero depth
+    # Returns a view of the first N rows of `out` (or the pooled buffer `self.valid_points`)
+    def reconstruct_valid(self, depth, out=None):
+        depth = depth.reshape(-1)
+        np.not_equal(depth, 0, out=self._mask)
+        return self.reconstruct_mask(depth, self._mask, out)
+
+    # Reconstruct only the pixels selected by a boolean mask of the organized image
+    # Returns a view of the first N rows of `out` (or the pooled buffer `self.valid_points`),
+    # the selected pixel indices are left in `self.index`
+    def reconstruct_mask(self, depth, mask, out=None):
+        if out is None:
+            out = self.valid_points
+        depth = depth.reshape(-1)
+        mask = mask.reshape(-1)
+        if depth.dtype != self._valid_depth.dtype:
+            self._valid_depth = np.zeros(self.n_points, dtype=depth.dtype)
+
+        n = np.count_nonzero(mask)
+        index = self._valid_index[:n]
+        np.compress(mask, self._index, out=index)
+        self.index = index
+
+        valid_depth = self._valid_depth[:n]
+        np.take(depth, index, out=valid_depth, mode='clip')
+        points = out[:n]
+        np.take(self.lut, index, axis=0, out=points, mode='clip')
+        np.multiply(points, valid_depth.reshape(-1, 1), out=points)
+        return points
+
+# Bits per axis of a packed voxel key (three signed axes in one int64)
+VOXEL_KEY_BITS = 21
+
+# Point cloud filter pipeline on the organized depth and intensity halves of the sensor image
+# The masks of the stages are combined on the 160x320 grid before reconstruction, so only the surviving
+# pixels are reconstructed. Stages (each optional):
+#   valid     : non-zero depth
+#   roi       : pixel window (row_start, row_end, col_start, col_end) of the depth image
+#   range     : depth_range = (min, max) depth in mm
+#   intensity : min_intensity, intensity (rows 160:320) confidence threshold
+#   voxel     : voxel_size [m], one point (the centroid) per voxel of a packed integer voxel key
+# The number of points surviving each stage of the last frame is kept in `counts`.
+class PointCloudFilter:
+    def __init__(self, reconstructor, depth_range=None, min_intensity=None, roi=None, voxel_size=None, rows=160, cols=320):
+        self.reconstructor = reconstructor
+        self.rows = rows
+        self.cols = cols
+        self.depth_range = depth_range
+        self.min_intensity = min_intensity
+        self.voxel_size = voxel_size
+        self.set_roi(roi)
+
+        # Reused buffers
+        n_points = rows * cols
+        self._mask = np.zeros(n_points, dtype=bool)
+        self._stage = np.zeros(n_points, dtype=bool)
+        self.points = np.zeros((n_points, 3), dtype=np.float32)
+        self.voxel_points = np.zeros((n_points, 3), dtype=np.float32)
+        self._voxel = np.zeros((n_points, 3), dtype=np.int64)
+        self._keys = np.zeros(n_points, dtype=np.int64)
+        self._starts = np.zeros(n_points, dtype=bool)
+
+        # Points surviving each stage of the last frame, and totals over all frames
+        self.counts = collections.OrderedDict()
+        self.totals = collections.OrderedDict()
+        self.frames = 0
+
+    # Set the pixel window (row_start, row_end, col_start, col_end) or None for the full image
+    def set_roi(self, roi):
+        self.roi = roi
+        self._roi_mask = None
+        if roi is not None:
+            row_start, row_end, col_start, col_end = roi
+            roi_mask = np.zeros((self.rows, self.cols), dtype=bool)
+            roi_mask[row_start:row_end, col_start:col_end] = True
+            self._roi_mask = roi_mask.reshape(-1)
+
+    # Pixel mask of the stages before reconstruction
+    def mask(self, depth, intensity=None):
+        depth = depth.reshape(-1)
+        mask = self._mask
+        np.not_equal(depth, 0, out=mask)
+        self._count('valid', mask)
+
+        if self._roi_mask is not None:
+            np.logical_and(mask, self._roi_mask, out=mask)
+            self._count('roi', mask)
+
+        if self.depth_range is not None:
+            min_depth, max_depth = self.depth_range
+            if min_depth is not None:
+                np.greater_equal(depth, min_depth, out=self._stage)
+                np.logical_and(mask, self._stage, out=mask)
+            if max_depth is not None:
+                np.less_equal(depth, max_depth, out=self._stage)
+                np.logical_and(mask, self._stage, out=mask)
+            self._count('range', mask)
+
+        if self.min_intensity is not None and intensity is not None:
+            np.greater_equal(intensity.reshape(-1), self.min_intensity, out=self._stage)
+            np.logical_and(mask, self._stage, out=mask)
+            self._count('intensity', mask)
+        return mask
+
+    # Filter one sensor image (img[:rows] depth, img[rows:2*rows] intensity)
+    # Returns a view of the surviving points (float32 N x 3), valid until the next call
+    def apply(self, img):
+        return self.apply_split(img[:self.rows], img[self.rows:2 * self.rows])
+
+    # Filter separate depth and intensity images
+    def apply_split(self, depth, intensity=None):
+        self.counts.clear()
+        self.counts['input'] = depth.size
+        mask = self.mask(depth, intensity)
+        points = self.reconstructor.reconstruct_mask(depth, mask, self.points)
+        if self.voxel_size is not None:
+            points = self.voxel_downsample(points)
+            self.counts['voxel'] = points.shape[0]
+
+        self.frames += 1
+        for stage, count in self.counts.items():
+            self.totals[stage] = self.totals.get(stage, 0) + count
+        return points
+
+    # Replace the points of each voxel by their centroid
+    def voxel_downsample(self, points):
+        n = points.shape[0]
+        if n == 0:
+            return self.voxel_points[:0]
+
+        # Packed voxel key: VOXEL_KEY_BITS bits per axis with an offset for negative coordinates
+        scaled = self.voxel_points[:n]
+        np.divide(points, self.voxel_size, out=scaled)
+        np.floor(scaled, out=scaled)
+        voxel = self._voxel[:n]
+        np.add(scaled, 1 << (VOXEL_KEY_BITS - 1), out=voxel, casting='unsafe')
+        keys = self._keys[:n]
+        np.left_shift(voxel[:, 0], 2 * VOXEL_KEY_BITS, out=keys)
+        np.left_shift(voxel[:, 1], VOXEL_KEY_BITS, out=voxel[:, 1])
+        np.bitwise_or(keys, voxel[:, 1], out=keys)
+        np.bitwise_or(keys, voxel[:, 2], out=keys)
+
+        # Group equal keys and average the points of each group
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        starts = self._starts[:n]
+        starts[0] = True
+        np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+        starts = np.flatnonzero(starts)
+        n_voxels = starts.shape[0]
+        counts = np.diff(starts, append=n).reshape(-1, 1)
+
+        out = self.voxel_points[:n_voxels]
+        np.divide(np.add.reduceat(points[order], starts, axis=0), counts, out=out)
+        return out
+
+    def _count(self, stage, mask):
+        self.counts[stage] = int(np.count_nonzero(mask))
+
+    # Filter statistics (last frame and totals)
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'last': dict(self.counts),
+            'totals': dict(self.totals),
+        }
+
+# Open3D hand-off modes
+OPEN3D_MODE_TENSOR = 'tensor'   # o3d.t.geometry.PointCloud, positions are a zero-copy view of a reused float32 buffer
+OPEN3D_MODE_DLPACK = 'dlpack'   # As OPEN3D_MODE_TENSOR, the view is passed through DLPack
+OPEN3D_MODE_LEGACY = 'legacy'   # o3d.geometry.PointCloud, written in place while the point count is unchanged
+OPEN3D_MODES = (OPEN3D_MODE_TENSOR, OPEN3D_MODE_DLPACK, OPEN3D_MODE_LEGACY)
+
+# Open3D is optional, imported on first use
+_open3d = None
+
+def import_open3d():
+    global _open3d
+    if _open3d is None:
+        try:
+            import open3d
+        except ImportError:
+            return None
+        _open3d = open3d
+    return _open3d
+
+# Persistent Open3D point cloud updated from reconstructed points without per-frame conversion
+# The geometry object stays the same, so it can be added to a visualizer once and updated every frame.
+# The legacy visualizers (o3d.visualization.Visualizer*) only draw legacy geometry, use OPEN3D_MODE_LEGACY there.
+class Open3DPointCloud:
+    def __init__(self, max_points=51200, mode=None, geometry=None):
+        o3d = import_open3d()
+        if o3d is None:
+            raise ImportError("Open3DPointCloud requires open3d (pip install open3d)")
+        if mode is None:
+            mode = OPEN3D_MODE_TENSOR if hasattr(o3d, 't') else OPEN3D_MODE_LEGACY
+        if mode not in OPEN3D_MODES:
+            raise ValueError(f"Unknown Open3D mode: {mode}")
+        if mode == OPEN3D_MODE_DLPACK and not (hasattr(o3d.core.Tensor, 'from_dlpack') and hasattr(np.ndarray, '__dlpack__')):
+            mode = OPEN3D_MODE_TENSOR
+
+        self.o3d = o3d
+        self.mode = mode
+        self.n_points = -1
+        if mode == OPEN3D_MODE_LEGACY:
+            # Legacy storage is float64, the conversion from a contiguous float64 array is a plain copy
+            self.buffer = np.zeros((max_points, 3), dtype=np.float64)
+            self.geometry = geometry if geometry is not None else o3d.geometry.PointCloud()
+        else:
+            self.buffer = np.zeros((max_points, 3), dtype=np.float32)
+            self.geometry = geometry if geometry is not None else o3d.t.geometry.PointCloud()
+
+    # Zero-copy tensor of the first n rows of the buffer
+    def _tensor(self, n):
+        view = self.buffer[:n]
+        if self.mode == OPEN3D_MODE_DLPACK:
+            return self.o3d.core.Tensor.from_dlpack(view.__dlpack__())
+        return self.o3d.core.Tensor.from_numpy(view)
+
+    # Copy the points (N x 3) into the geometry, returns the geometry
+    def update(self, points):
+        n = len(points)
+        if self.mode == OPEN3D_MODE_LEGACY:
+            if n == self.n_points:
+                np.copyto(np.asarray(self.geometry.points), points, casting='unsafe')
+            else:
+                view = self.buffer[:n]
+                np.copyto(view, points, casting='unsafe')
+                self.geometry.points = self.o3d.utility.Vector3dVector(view)
+        else:
+            np.copyto(self.buffer[:n], points, casting='unsafe')
+            self.geometry.point.positions = self._tensor(n)
+        self.n_points = n
+        return self.geometry
+
+# Multi-sensor point cloud fusion into one merged buffer
+# Each sensor's 4x4 extrinsic (sensor to rig, translation in m) is baked into its ray table once:
+#   p = R (d * ray) + t = d * (R ray) + t
+# so fusing a frame set is one broadcast multiply-add over all sensors (S x N x 3) without allocation.
+# `luts` are rotated and scaled ray tables (PointCloudReconstructor.lut, or IntrinsicRegistry.get(..., rotate=True)).
+class PointCloudFusion:
+    def __init__(self, luts, extrinsics):
+        if len(luts) != len(extrinsics):
+            raise ValueError("PointCloudFusion needs one extrinsic per sensor")
+
+        self.n_sensors = len(luts)
+        self.n_points = luts[0].shape[0]
+        self.extrinsics = np.array(extrinsics, dtype=np.float64).reshape(self.n_sensors, 4, 4)
+
+        # Baked ray tables and translations
+        rotations = self.extrinsics[:, :3, :3]
+        self.rays = np.matmul(np.array(luts, dtype=np.float64), rotations.transpose(0, 2, 1)).astype(np.float32)
+        self.translations = self.extrinsics[:, :3, 3].astype(np.float32).reshape(self.n_sensors, 1, 3)
+
+        # Merged buffers (organized: sensor s owns rows [s * n_points, (s + 1) * n_points))
+        self.points = np.zeros((self.n_sensors * self.n_points, 3), dtype=np.float32)
+        self.sensor_ids = np.repeat(np.arange(self.n_sensors, dtype=np.uint8), self.n_points)
+        self.valid_points = np.zeros_like(self.points)
+        self.valid_sensor_ids = np.zeros_like(self.sensor_ids)
+        self._depth = np.zeros((self.n_sensors, self.n_points), dtype=np.uint16)
+        self._mask = np.zeros(self.n_sensors * self.n_points, dtype=bool)
+        self._index = np.arange(self.n_sensors * self.n_points, dtype=np.intp)
+        self._valid_index = np.zeros(self.n_sensors * self.n_points, dtype=np.intp)
+        self.counts = np.zeros(self.n_sensors, dtype=np.int64)
+
+    # Create from sensor models (110 or 80) of the shared intrinsic registry
+    @classmethod
+    def from_models(cls, models, extrinsics, crop=INTRINSIC_DEFAULT_CROP, scale=0.001, registry=None):
+        if registry is None:
+            registry = intrinsic_registry
+        return cls([registry.get(model, crop, rotate=True, scale=scale) for model in models], extrinsics)
+
+    # Depth images of all sensors as one (S, N) array
+    # `depths` is a (S, rows, cols) array (e.g. iTFSManager.frames[:, :160, :]) or a list of depth images
+    def _stack(self, depths):
+        if isinstance(depths, np.ndarray) and depths.shape[0] == self.n_sensors and depths.size == self.n_sensors * self.n_points:
+            return depths.reshape(self.n_sensors, self.n_points)
+        for sensor, depth in enumerate(depths):
+            np.copyto(self._depth[sensor], depth.reshape(-1))
+        return self._depth
+
+    # Fuse all pixels (zero-depth pixels land on the sensor origin)
+    # Returns the merged (S * N, 3) points, the matching sensor ids are in `self.sensor_ids`
+    def fuse(self, depths, out=None):
+        if out is None:
+            out = self.points
+        depth = self._stack(depths)
+        merged = out.reshape(self.n_sensors, self.n_points, 3)
+        np.multiply(self.rays, depth.reshape(self.n_sensors, self.n_points, 1), out=merged)
+        np.add(merged, self.translations, out=merged)
+        return out
+
+    # Fuse only the pixels with non-zero depth
+    # Returns (points, sensor_ids) views of the pooled buffers, points per sensor are in `self.counts`
+    def fuse_valid(self, depths):
+        depth = self._stack(depths)
+        self.fuse(depth)
+        np.not_equal(depth.reshape(-1), 0, out=self._mask)
+        self.counts[:] = np.count_nonzero(self._mask.reshape(self.n_sensors, self.n_points), axis=1)
+        n = int(self.counts.sum())
+
+        index = self._valid_index[:n]
+        np.compress(self._mask, self._index, out=index)
+        points = self.valid_points[:n]
+        np.take(self.points, index, axis=0, out=points, mode='clip')
+        sensor_ids = self.valid_sensor_ids[:n]
+        np.take(self.sensor_ids, index, out=sensor_ids, mode='clip')
+        return points, sensor_ids
+
+# Temporal exponential moving average of the depth image
+# Zero (invalid) pixels are passed through and restart the average. With `motion_threshold` [mm], pixels
+# that differ from the average by more than the threshold are reset to the new depth (motion gating).
+# update() writes into `out` (e.g. img[:160, :] for in place) or the pooled buffer `self.output`.
+class TemporalEMAFilter:
+    def __init__(self, alpha=0.3, motion_threshold=None, shape=(160, 320)):
+        self.alpha = alpha
+        self.motion_threshold = motion_threshold
+        self.state = np.zeros(shape, dtype=np.float32)
+        self.output = np.zeros(shape, dtype=np.uint16)
+        self._diff = np.zeros(shape, dtype=np.float32)
+        self._reset = np.zeros(shape, dtype=bool)
+        self._stage = np.zeros(shape, dtype=bool)
+        self.frames = 0
+        self.resets = 0         # Pixels reset by motion gating in the last frame
+
+    def reset(self):
+        self.state.fill(0)
+        self.frames = 0
+
+    def update(self, depth, out=None):
+        if out is None:
+            out = self.output
+
+        # Pixels restarting from the new depth: invalid now or before, or moving
+        np.subtract(depth, self.state, out=self._diff)
+        np.equal(self.state, 0, out=self._reset)
+        np.equal(depth, 0, out=self._stage)
+        np.logical_or(self._reset, self._stage, out=self._reset)
+        if self.motion_threshold is not None:
+            np.abs(self._diff, out=self._diff)
+            np.greater(self._diff, self.motion_threshold, out=self._stage)
+            self.resets = int(np.count_nonzero(self._stage))
+            np.logical_or(self._reset, self._stage, out=self._reset)
+            np.subtract(depth, self.state, out=self._diff)
+
+        # state += alpha * (depth - state)
+        np.multiply(self._diff, self.alpha, out=self._diff)
+        np.add(self.state, self._diff, out=self.state)
+        np.copyto(self.state, depth, where=self._reset)
+
+        np.rint(self.state, out=self._diff)
+        np.copyto(out, self._diff, casting='unsafe')
+        self.frames += 1
+        return out
+
+# Temporal median of the depth image over the last `window` frames, kept in a uint16 ring
+# With `motion_threshold` [mm], pixels that differ from the median by more than the threshold output the
+# new depth and their history is restarted (motion gating).
+# update() writes into `out` (e.g. img[:160, :] for in place) or the pooled buffer `self.output`.
+class TemporalMedianFilter:
+    def __init__(self, window=5, motion_threshold=None, shape=(160, 320)):
+        self.window = window
+        self.motion_threshold = motion_threshold
+        self.history = np.zeros((window,) + tuple(shape), dtype=np.uint16)
+        self.output = np.zeros(shape, dtype=np.uint16)
+        self._sorted = np.zeros((window,) + tuple(shape), dtype=np.uint16)
+        self._low = np.zeros(shape, dtype=np.uint16)
+        self._median = np.zeros(shape, dtype=np.int32)
+        self._diff = np.zeros(shape, dtype=np.int32)
+        self._stage = np.zeros(shape, dtype=bool)
+        self.frames = 0
+        self.resets = 0         # Pixels reset by motion gating in the last frame
+
+    def reset(self):
+        self.history.fill(0)
+        self.frames = 0
+
+    def update(self, depth, out=None):
+        if out is None:
+            out = self.output
+
+        # The history slot keeps the incoming depth, which `out` may alias
+        current = self.history[self.frames % self.window]
+        np.copyto(current, depth)
+        self.frames += 1
+        n = min(self.frames, self.window)
+
+        # Median of the filled slots (mean of the two middle values for an even count)
+        # Partial bubble sort with element-wise min/max: after n // 2 + 1 passes the upper half
+        # (including both middle values) is in place. Much faster than np.partition along the frame axis.
+        window = self._sorted[:n]
+        np.copyto(window, self.history[:n])
+        middle = n // 2
+        for i in range(middle + 1):
+            for j in range(n - 1 - i):
+                np.minimum(window[j], window[j + 1], out=self._low)
+                np.maximum(window[j], window[j + 1], out=window[j + 1])
+                np.copyto(window[j], self._low)
+        if n % 2 == 1:
+            median = window[middle]
+        else:
+            median = self._median
+            np.add(window[middle - 1], window[middle], out=median, dtype=np.int32)
+            np.right_shift(median, 1, out=median)
+
+        if self.motion_threshold is not None:
+            np.subtract(current, median, out=self._diff, dtype=np.int32)
+            np.abs(self._diff, out=self._diff)
+            np.greater(self._diff, self.motion_threshold, out=self._stage)
+            self.resets = int(np.count_nonzero(self._stage))
+            if self.resets > 0:
+                # Restart the history of the moving pixels from the new depth
+                self.history[:, self._stage] = current[self._stage]
+                np.copyto(out, median, casting='unsafe')
+                np.copyto(out, current, where=self._stage)
+                return out
+
+        np.copyto(out, median, casting='unsafe')
+        return out
+
+# Colormap anchors (RGB, evenly spaced from the low to the high end of the range)
+COLORMAPS = {
+    'gray': [(0, 0, 0), (255, 255, 255)],
+    'jet': [(0, 0, 128), (0, 0, 255), (0, 128, 255), (0, 255, 255), (128, 255, 128), (255, 255, 0), (255, 128, 0), (255, 0, 0), (128, 0, 0)],
+    'viridis': [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)],
+    'inferno': [(0, 0, 4), (87, 16, 110), (188, 55, 84), (249, 142, 9), (252, 255, 164)],
+}
+
+# 256-entry BGR palette of a colormap name or a (N, 3) RGB anchor array
+def make_palette(colormap):
+    if isinstance(colormap, str):
+        if colormap not in COLORMAPS:
+            raise ValueError(f"Unknown colormap: {colormap}, use one of {list(COLORMAPS.keys())}")
+        colormap = COLORMAPS[colormap]
+    anchors = np.asarray(colormap, dtype=np.float64)
+    if anchors.ndim != 2 or anchors.shape[0] < 2 or anchors.shape[1] != 3:
+        raise ValueError(f"A colormap needs at least two RGB anchors, got shape {anchors.shape}")
+    positions = np.linspace(0.0, 255.0, anchors.shape[0])
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    for channel in range(3):
+        # RGB anchors to BGR palette
+        palette[:, 2 - channel] = np.rint(np.interp(np.arange(256), positions, anchors[:, channel]))
+    return palette
+
+# 65536-entry uint8 lookup table of the normalization np.clip(((v - low) / (high - low)) * 255, 0, 255)
+def make_level_lut(value_range):
+    low, high = value_range
+    if high <= low:
+        raise ValueError(f"Invalid value range: {value_range}")
+    values = np.arange(65536, dtype=np.float64)
+    return np.clip(((values - low) / (high - low)) * 255, 0, 255).astype(np.uint8)
+
+# 65536-entry lookup table of a uint16 image, uint8 levels (colormap=None) or BGR colors
+# `invalid_color` (BGR or gray level) is used for zero values, e.g. pixels without depth
+def make_color_lut(value_range, colormap=None, invalid_color=None):
+    lut = make_level_lut(value_range)
+    if colormap is not None:
+        lut = make_palette(colormap)[lut]
+    if invalid_color is not None:
+        lut[0] = invalid_color
+    return lut
+
+# Depth and intensity colorization of the sensor image through precomputed lookup tables
+# Both halves of the 320x320 image are converted in one call into preallocated outputs. When both
+# outputs have the same format they are the two halves of `preview` (depth on top, intensity below).
+# An unknown colormap or an empty range raises ValueError, and the previous tables are kept.
+class FrameColorizer:
+    def __init__(self, depth_range=(0, 8000), intensity_range=(0, 16384), depth_colormap=None, intensity_colormap=None, invalid_color=None, rows=160, cols=320):
+        self.rows = rows
+        self.cols = cols
+        self.depth_range = depth_range
+        self.intensity_range = intensity_range
+        self.depth_colormap = depth_colormap
+        self.intensity_colormap = intensity_colormap
+        self.invalid_color = invalid_color
+        self.build()
+
+    # (Re)build the lookup tables and the output buffers
+    def build(self):
+        depth_lut = make_color_lut(self.depth_range, self.depth_colormap, self.invalid_color)
+        intensity_lut = make_color_lut(self.intensity_range, self.intensity_colormap)
+        self.depth_lut = depth_lut
+        self.intensity_lut = intensity_lut
+
+        depth_shape = (self.rows, self.cols) + self.depth_lut.shape[1:]
+        intensity_shape = (self.rows, self.cols) + self.intensity_lut.shape[1:]
+        if depth_shape == intensity_shape:
+            self.preview = np.zeros((2 * self.rows, self.cols) + self.depth_lut.shape[1:], dtype=np.uint8)
+            self.depth_out = self.preview[:self.rows]
+            self.intensity_out = self.preview[self.rows:]
+        else:
+            self.preview = None
+            self.depth_out = np.zeros(depth_shape, dtype=np.uint8)
+            self.intensity_out = np.zeros(intensity_shape, dtype=np.uint8)
+        return True
 
-    return diff
+    # Change the depth or intensity range (rebuilds the lookup tables)
+    def set_range(self, depth_range=None, intensity_range=None):
+        if depth_range is None:
+            depth_range = self.depth_range
+        if intensity_range is None:
+            intensity_range = self.intensity_range
+        return self._rebuild(depth_range, intensity_range, self.depth_colormap, self.intensity_colormap)
+
+    # Change the depth or intensity colormap (None for uint8 levels)
+    def set_colormap(self, depth_colormap=None, intensity_colormap=None):
+        return self._rebuild(self.depth_range, self.intensity_range, depth_colormap, intensity_colormap)
+
+    # Rebuild with new settings, restored if they are invalid
+    def _rebuild(self, depth_range, intensity_range, depth_colormap, intensity_colormap):
+        previous = (self.depth_range, self.intensity_range, self.depth_colormap, self.intensity_colormap)
+        self.depth_range, self.intensity_range, self.depth_colormap, self.intensity_colormap = depth_range, intensity_range, depth_colormap, intensity_colormap
+        try:
+            return self.build()
+        except ValueError:
+            self.depth_range, self.intensity_range, self.depth_colormap, self.intensity_colormap = previous
+            raise
+
+    # Colorize both halves of the sensor image, returns (depth_out, intensity_out)
+    def colorize(self, img, depth_out=None, intensity_out=None):
+        if depth_out is None:
+            depth_out = self.depth_out
+        if intensity_out is None:
+            intensity_out = self.intensity_out
+        np.take(self.depth_lut, img[:self.rows], axis=0, out=depth_out)
+        np.take(self.intensity_lut, img[self.rows:2 * self.rows], axis=0, out=intensity_out)
+        return depth_out, intensity_out
+
+# Frame recording file layout
+#   header  : RECORD_HEADER_FORMAT padded to RECORD_HEADER_SIZE bytes
+#   records : contiguous records of record_dtype(rows, cols), written in chunks by a background thread
+#   index   : RECORD_INDEX_DTYPE entry per frame (file offset, sequence number, host timestamp)
+#   trailer : RECORD_TRAILER_FORMAT (index offset and frame count) for O(1) access from the end of the file
+RECORD_MAGIC = b'ITFSREC1'
+RECORD_INDEX_MAGIC = b'ITFSIDX1'
+RECORD_VERSION = 1
+RECORD_HEADER_FORMAT = '<8sIIIIqq'
+RECORD_HEADER_SIZE = 64
+RECORD_TRAILER_FORMAT = '<8sQQ'
+RECORD_INDEX_DTYPE = np.dtype([('offset', '<u8'), ('seq', '<u8'), ('timestamp_ns', '<i8')])
+
+# Record of a single frame in a recording file
+def record_dtype(rows=320, cols=320):
+    return np.dtype([
+        ('seq', '<u8'),
+        ('timestamp_ns', '<i8'),
+        ('params', 'u1', 166),      # Raw info_v2 block active when the frame was received
+        ('reserved', 'u1', 2),
+        ('frame', '<u2', (rows, cols)),
+    ])
+
+# Recorder of raw frames into a chunked file
+# push() only copies the frame into a preallocated record ring, so it never blocks the sensor callback.
+# A background thread writes contiguous runs of records to the file. If the disk cannot keep up,
+# new frames are dropped and counted in `drops`.
+class FrameRecorder:
+    def __init__(self, file_path, shape=(320, 320), n_slots=64, chunk_frames=16, params_source=None):
+        self.file_path = file_path
+        self.shape = tuple(shape)
+        self.n_slots = n_slots
+        self.chunk_frames = chunk_frames
+        self.params_source = params_source
+
+        self.dtype = record_dtype(*self.shape)
+        self._records = np.zeros(n_slots, dtype=self.dtype)
+        self._seqs = self._records['seq']
+        self._timestamps = self._records['timestamp_ns']
+        self._params = self._records['params']
+        self._frames = self._records['frame']
+        self._index = []
+
+        # Counters
+        self.write_count = 0    # Frames accepted into the record ring
+        self.read_count = 0     # Frames written to the file
+        self.drops = 0          # Frames rejected because the ring was full
+
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._pushing = 0       # push() calls between slot reservation and commit
+
+        # Header
+        self._fp = open(file_path, 'wb')
+        header = struct.pack(RECORD_HEADER_FORMAT, RECORD_MAGIC, RECORD_VERSION, self.shape[0], self.shape[1],
+                             self.dtype.itemsize, time.time_ns(), time.perf_counter_ns())
+        self._fp.write(header.ljust(RECORD_HEADER_SIZE, b'\0'))
+        self._offset = RECORD_HEADER_SIZE
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Copy a frame into the record ring (frame sink, called from the sensor callback)
+    # Frames pushed after close() are rejected; a push already in progress is written before the file is closed.
+    def push(self, frame, seq, timestamp_ns):
+        with self._cond:
+            if self._stopping:
+                return False
+            if self._pushing > 0 or self.write_count - self.read_count >= self.n_slots:
+                self.drops += 1
+                return False
+            idx = self.write_count % self.n_slots
+            self._pushing += 1
+
+        self._seqs[idx] = seq
+        self._timestamps[idx] = timestamp_ns
+        if self.params_source is not None:
+            self._params[idx] = np.frombuffer(self.params_source(), dtype=np.uint8)
+        np.copyto(self._frames[idx], frame)
+
+        with self._cond:
+            self.write_count += 1
+            self._pushing -= 1
+            self._cond.notify_all()
+        return True
+
+    # Writer thread
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.write_count > self.read_count or (self._stopping and self._pushing == 0))
+                pending = self.write_count - self.read_count
+                if pending == 0:
+                    break
+                first = self.read_count % self.n_slots
+                count = min(pending, self.n_slots - first, self.chunk_frames)
+
+            chunk = self._records[first:first + count]
+            index = np.zeros(count, dtype=RECORD_INDEX_DTYPE)
+            index['offset'] = self._offset + np.arange(count, dtype=np.uint64) * self.dtype.itemsize
+            index['seq'] = chunk['seq']
+            index['timestamp_ns'] = chunk['timestamp_ns']
+            self._fp.write(chunk.data)
+            self._offset += count * self.dtype.itemsize
+            self._index.append(index)
+
+            with self._cond:
+                self.read_count += count
+                self._cond.notify_all()
+
+    # Flush pending frames, write the index and close the file
+    def close(self):
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+
+        if len(self._index) > 0:
+            index = np.concatenate(self._index)
+        else:
+            index = np.zeros(0, dtype=RECORD_INDEX_DTYPE)
+        self._fp.write(RECORD_INDEX_MAGIC)
+        self._fp.write(index.data)
+        self._fp.write(struct.pack(RECORD_TRAILER_FORMAT, RECORD_INDEX_MAGIC, self._offset, len(index)))
+        self._fp.close()
+
+    # Counter snapshot
+    def stats(self):
+        with self._cond:
+            return {
+                'frames': self.read_count,
+                'pending': self.write_count - self.read_count,
+                'drops': self.drops,
+            }
+
+# Read-only access to a recording file through np.memmap (no copy)
+# A file that was not closed properly (no index) is still readable up to the last complete record.
+class FrameRecording:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        file_size = os.path.getsize(file_path)
+
+        with open(file_path, 'rb') as fp:
+            header = fp.read(struct.calcsize(RECORD_HEADER_FORMAT))
+            magic, version, rows, cols, record_size, start_time_ns, start_perf_ns = struct.unpack(RECORD_HEADER_FORMAT, header)
+            if magic != RECORD_MAGIC:
+                raise ValueError(f"Not an iTFS recording file: {file_path}")
+
+            trailer_size = struct.calcsize(RECORD_TRAILER_FORMAT)
+            n_frames = None
+            if file_size >= RECORD_HEADER_SIZE + trailer_size:
+                fp.seek(file_size - trailer_size)
+                trailer_magic, index_offset, n = struct.unpack(RECORD_TRAILER_FORMAT, fp.read(trailer_size))
+                if trailer_magic == RECORD_INDEX_MAGIC:
+                    n_frames = n
+
+        self.version = version
+        self.shape = (rows, cols)
+        self.start_time_ns = start_time_ns
+        self.start_perf_ns = start_perf_ns
+        self.dtype = record_dtype(rows, cols)
+        if self.dtype.itemsize != record_size:
+            raise ValueError(f"Unsupported record size in {file_path}: {record_size}")
+
+        self.n_frames = n_frames if n_frames is not None else (file_size - RECORD_HEADER_SIZE) // record_size
+        if self.n_frames > 0:
+            self.records = np.memmap(file_path, dtype=self.dtype, mode='r', offset=RECORD_HEADER_SIZE, shape=(self.n_frames,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+        if n_frames is not None:
+            self.index = np.memmap(file_path, dtype=RECORD_INDEX_DTYPE, mode='r', offset=index_offset + len(RECORD_INDEX_MAGIC), shape=(n_frames,))
+        else:
+            # Rebuild the index of an unterminated recording
+            self.index = np.zeros(self.n_frames, dtype=RECORD_INDEX_DTYPE)
+            self.index['offset'] = RECORD_HEADER_SIZE + np.arange(self.n_frames, dtype=np.uint64) * record_size
+            self.index['seq'] = self.records['seq']
+            self.index['timestamp_ns'] = self.records['timestamp_ns']
+
+        self.frames = self.records['frame']
+        self.seqs = self.index['seq']
+        self.timestamps = self.index['timestamp_ns']
+
+    def __len__(self):
+        return self.n_frames
+
+    # Frame view of the i-th record
+    def __getitem__(self, i):
+        return self.frames[i]
+
+    # Decoded params snapshot of the i-th record
+    def params(self, i):
+        return decode_info_v2(bytearray(self.records['params'][i]))
+
+# Point cloud export formats
+EXPORT_FORMAT_PLY = 'ply'       # Binary little-endian PLY, one file per frame
+EXPORT_FORMAT_PCD = 'pcd'       # Binary PCD, one file per frame
+EXPORT_FORMAT_NPY = 'npy'       # Structured .npy (seq, x, y, z[, intensity]), up to chunk_frames frames per file
+EXPORT_FORMATS = (EXPORT_FORMAT_PLY, EXPORT_FORMAT_PCD, EXPORT_FORMAT_NPY)
+
+# Export queue policies when the disk can't keep up
+EXPORT_DROP_NEWEST = 'drop_newest'      # Reject the new frame
+EXPORT_DROP_OLDEST = 'drop_oldest'      # Replace the oldest queued frame
+EXPORT_POLICIES = (EXPORT_DROP_NEWEST, EXPORT_DROP_OLDEST)
+
+# Binary point cloud file of N points, fields of `points` (structured array)
+def write_point_cloud(file_path, points, fmt=EXPORT_FORMAT_PLY):
+    names = points.dtype.names
+    with open(file_path, 'wb') as fp:
+        if fmt == EXPORT_FORMAT_PLY:
+            types = {'f4': 'float', 'u2': 'ushort', 'u8': 'uint64'}
+            header = "ply\nformat binary_little_endian 1.0\n"
+            header += f"element vertex {len(points)}\n"
+            for name in names:
+                header += f"property {types[points.dtype[name].str[1:]]} {name}\n"
+            header += "end_header\n"
+            fp.write(header.encode('ascii'))
+        elif fmt == EXPORT_FORMAT_PCD:
+            header = "# .PCD v0.7 - Point Cloud Data file format\nVERSION 0.7\n"
+            header += "FIELDS " + " ".join(names) + "\n"
+            header += "SIZE " + " ".join(str(points.dtype[name].itemsize) for name in names) + "\n"
+            header += "TYPE " + " ".join(points.dtype[name].kind.upper() for name in names) + "\n"
+            header += "COUNT " + " ".join('1' for _ in names) + "\n"
+            header += f"WIDTH {len(points)}\nHEIGHT 1\nVIEWPOINT 0 0 0 1 0 0 0\nPOINTS {len(points)}\nDATA binary\n"
+            fp.write(header.encode('ascii'))
+        else:
+            np.lib.format.write_array_header_1_0(fp, np.lib.format.header_data_from_array_1_0(points))
+        points.tofile(fp)
+    return os.path.getsize(file_path)
+
+# Background exporter of point clouds to binary PLY, PCD or chunked .npy files
+# Submissions copy the points (or the raw depth and intensity) into a preallocated buffer and return at once,
+# a thread pool reconstructs and writes them with bulk writes. When all buffers are queued the `policy`
+# decides which frame is dropped, so a slow disk never stalls the sensor callback.
+# Every file of an exporter has the same fields: x, y, z, plus intensity with `with_intensity` (zero for
+# points exported without it) and seq for .npy. `max_points` (default rows * cols) sizes the point buffers.
+class PointCloudExporter:
+    def __init__(self, directory, fmt=EXPORT_FORMAT_PLY, reconstructor=None, max_queue=16, n_workers=2, policy=EXPORT_DROP_NEWEST,
+                 with_intensity=True, chunk_frames=16, prefix="cloud", rows=160, cols=320, max_points=None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if policy not in EXPORT_POLICIES:
+            raise ValueError(f"Unknown export policy: {policy}")
+
+        self.directory = directory
+        self.fmt = fmt
+        self.reconstructor = reconstructor
+        self.max_queue = max_queue
+        self.policy = policy
+        self.with_intensity = with_intensity
+        self.chunk_frames = chunk_frames if fmt == EXPORT_FORMAT_NPY else 1
+        self.prefix = prefix
+        self.rows = rows
+        self.cols = cols
+        self.max_points = max(rows * cols, max_points or 0)
+        os.makedirs(directory, exist_ok=True)
+
+        # Output dtype, fixed so that frames of one .npy chunk can always be concatenated
+        fields = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')]
+        if with_intensity:
+            fields.append(('intensity', '<u2'))
+        if fmt == EXPORT_FORMAT_NPY:
+            fields.insert(0, ('seq', '<u8'))
+        self.dtype = np.dtype(fields)
+
+        # Preallocated buffers, one per queued or in-flight frame
+        n_buffers = max_queue + n_workers
+        self._points = np.zeros((n_buffers, self.max_points, 3), dtype=np.float32)
+        self._intensity = np.zeros((n_buffers, self.max_points), dtype=np.uint16)
+        self._depth = np.zeros((n_buffers, rows, cols), dtype=np.uint16)
+        self._free = list(range(n_buffers))
+        self._queue = collections.deque()      # (buffer, seq, kind, n_points)
+
+        # Counters
+        self.submitted = 0
+        self.written = 0        # Frames written to files
+        self.files = 0
+        self.bytes = 0
+        self.drops = 0
+        self.errors = 0
+
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(n_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    # Take a free buffer, or None when the frame has to be dropped
+    def _acquire(self):
+        with self._cond:
+            if self._stopping:
+                self.drops += 1
+                return None
+            self.submitted += 1
+            if len(self._free) > 0:
+                return self._free.pop()
+            if self.policy == EXPORT_DROP_OLDEST and len(self._queue) > 0:
+                self.drops += 1
+                return self._queue.popleft()[0]
+            self.drops += 1
+            return None
+
+    def _enqueue(self, buffer, seq, kind, n_points):
+        with self._cond:
+            self._queue.append((buffer, seq, kind, n_points))
+            self._cond.notify()
+
+    # Return an acquired buffer that was not queued
+    def _release(self, buffer):
+        with self._cond:
+            self.submitted -= 1
+            self._free.append(buffer)
+            self._cond.notify_all()
+
+    # Export reconstructed points (N x 3, at most max_points) with optional per-point intensity
+    # Returns False if the frame was dropped
+    def export_points(self, points, seq, intensity=None):
+        n_points = len(points)
+        if n_points > self.max_points:
+            raise ValueError(f"Too many points to export: {n_points} (max_points={self.max_points})")
+        buffer = self._acquire()
+        if buffer is None:
+            return False
+        try:
+            np.copyto(self._points[buffer, :n_points], points, casting='unsafe')
+            if self.with_intensity:
+                if intensity is None:
+                    self._intensity[buffer, :n_points] = 0
+                else:
+                    np.copyto(self._intensity[buffer, :n_points], intensity.reshape(-1), casting='unsafe')
+        except BaseException:
+            self._release(buffer)
+            raise
+        self._enqueue(buffer, seq, 'points', n_points)
+        return True
+
+    # Export a sensor image (depth img[:rows], intensity img[rows:2*rows]), reconstructed in the background
+    # with the intrinsic table of `reconstructor`. Zero-depth pixels are not exported.
+    def export_frame(self, img, seq):
+        if self.reconstructor is None:
+            print("Fail to export the frame. The exporter has no PointCloudReconstructor.")
+            return False
+        buffer = self._acquire()
+        if buffer is None:
+            return False
+        try:
+            np.copyto(self._depth[buffer], img[:self.rows])
+            if self.with_intensity:
+                np.copyto(self._intensity[buffer, :self.rows * self.cols].reshape(self.rows, self.cols), img[self.rows:2 * self.rows])
+        except BaseException:
+            self._release(buffer)
+            raise
+        self._enqueue(buffer, seq, 'frame', 0)
+        return True
+
+    # Frame sink (iTFS.add_sink(exporter.push))
+    def push(self, frame, seq, timestamp_ns):
+        self.export_frame(frame, seq)
+
+    # Structured points of a queued frame
+    def _prepare(self, buffer, seq, kind, n_points):
+        if kind == 'frame':
+            depth = self._depth[buffer].reshape(-1)
+            index = np.flatnonzero(depth)
+            n_points = len(index)
+            points = self._points[buffer, :n_points]
+            np.take(self.reconstructor.lut, index, axis=0, out=points)
+            np.multiply(points, depth[index].reshape(-1, 1), out=points)
+            intensity = self._intensity[buffer][index]
+        else:
+            points = self._points[buffer, :n_points]
+            intensity = self._intensity[buffer, :n_points]
+
+        out = np.zeros(n_points, dtype=self.dtype)
+        out['x'] = points[:, 0]
+        out['y'] = points[:, 1]
+        out['z'] = points[:, 2]
+        if self.with_intensity:
+            out['intensity'] = intensity
+        if self.fmt == EXPORT_FORMAT_NPY:
+            out['seq'] = seq
+        return out
+
+    # Writer thread
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._queue) > 0 or self._stopping)
+                if len(self._queue) == 0:
+                    break
+                items = [self._queue.popleft()]
+                while len(items) < self.chunk_frames and len(self._queue) > 0:
+                    items.append(self._queue.popleft())
+
+            file_path = os.path.join(self.directory, f"{self.prefix}_{items[0][1]:08d}.{self.fmt}")
+            error = True
+            try:
+                chunks = [self._prepare(*item) for item in items]
+                points = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+                size = write_point_cloud(file_path, points, self.fmt)
+                error = False
+            except Exception as e:
+                # Keep the thread alive, the frames are counted as an error
+                print(f"Fail to export {file_path}: {e}")
+            finally:
+                with self._cond:
+                    self._free.extend(item[0] for item in items)
+                    if error:
+                        self.errors += 1
+                    else:
+                        self.written += len(items)
+                        self.files += 1
+                        self.bytes += size
+                    self._cond.notify_all()
+
+    # Wait until all queued frames are written
+    def flush(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._free) == len(self._points), timeout)
+
+    # Write the queued frames and stop the threads
+    def close(self):
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    # Counter snapshot
+    def stats(self):
+        with self._cond:
+            return {
+                'submitted': self.submitted,
+                'written': self.written,
+                'pending': len(self._points) - len(self._free),
+                'files': self.files,
+                'bytes': self.bytes,
+                'drops': self.drops,
+                'errors': self.errors,
+            }
+
+# Histogram of durations with power-of-two nanosecond buckets
+# Bucket b counts durations in [2^(b-1), 2^b) ns, the last bucket also counts everything above.
+class LatencyHistogram:
+    def __init__(self, n_buckets=40):
+        self.n_buckets = n_buckets
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.n_buckets
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    # Add a duration (ns)
+    def add(self, duration_ns):
+        bucket = duration_ns.bit_length()
+        if bucket >= self.n_buckets:
+            bucket = self.n_buckets - 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    # Upper bound (ns) of the bucket holding the q-quantile (0.0 - 1.0)
+    def quantile(self, q):
+        if self.count == 0:
+            return 0
+        target = q * self.count
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count > 0:
+                return min(1 << bucket, self.max_ns)
+        return self.max_ns
+
+    # Snapshot as dict (durations in ns)
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ns': self.total_ns / self.count if self.count > 0 else 0.0,
+            'p50_ns': self.quantile(0.5),
+            'p99_ns': self.quantile(0.99),
+            'max_ns': self.max_ns,
+            'buckets': {1 << bucket: count for bucket, count in enumerate(self.counts) if count > 0},
+        }
+
+# Built-in sensor callback of iTFS.init_ring()
+# Runs on the native receive thread with the GIL held and only does the minimum: bump the frame
+# counter, stamp perf_counter_ns(), copy the frame into the ring, call the frame sinks with the ring
+# sequence number and set the event. Frames rejected by a RING_POLICY_BLOCK ring skip the sinks.
+# With `coalesce_interval` (seconds) the event is set at most once per interval; consumers using
+# wait() still see every frame because they poll the ring at that interval.
+class FrameTrampoline:
+    def __init__(self, img, ring, coalesce_interval=0.0, user_callback=None):
+        self.img = img
+        self.ring = ring
+        self.coalesce_interval_ns = int(coalesce_interval * 1e9)
+        self.user_callback = user_callback
+        self.sinks = []
+
+        self.count = 0
+        self.signals = 0
+        self.last_timestamp_ns = 0
+        self.event = threading.Event()
+        self.histogram = LatencyHistogram()
+        self._last_signal_ns = 0
+
+        self.ctype_callback = CALLBACK_TYPE(self)
+
+    def __call__(self, ptr):
+        timestamp_ns = time.perf_counter_ns()
+        self.count += 1
+        self.last_timestamp_ns = timestamp_ns
+
+        # Sinks share the sequence numbers of the ring, a frame it rejected (RING_POLICY_BLOCK) has none
+        seq = self.ring.push(self.img, timestamp_ns)
+        if seq >= 0:
+            for sink in self.sinks:
+                sink(self.img, seq, timestamp_ns)
+        if self.user_callback is not None:
+            self.user_callback(ptr)
+
+        if timestamp_ns - self._last_signal_ns >= self.coalesce_interval_ns:
+            self._last_signal_ns = timestamp_ns
+            self.signals += 1
+            self.event.set()
+
+        self.histogram.add(time.perf_counter_ns() - timestamp_ns)
+
+    # Wait until the ring has unread frames, returns False on timeout
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.ring.pending() == 0:
+            wait_s = None
+            if deadline is not None:
+                wait_s = deadline - time.perf_counter()
+                if wait_s <= 0:
+                    return False
+            if self.coalesce_interval_ns > 0:
+                interval_s = self.coalesce_interval_ns * 1e-9
+                wait_s = interval_s if wait_s is None else min(wait_s, interval_s)
+            self.event.wait(wait_s)
+            self.event.clear()
+        return True
+
+    # Callback statistics
+    def stats(self):
+        return {
+            'frames': self.count,
+            'signals': self.signals,
+            'last_timestamp_ns': self.last_timestamp_ns,
+            'duration': self.histogram.snapshot(),
+        }
+
+# Upper bounds of the inter-frame interval histogram, relative to capture_period_us
+FRAME_INTERVAL_RATIOS = (0.5, 0.9, 1.1, 1.5, 2.5, 5.0, float('inf'))
+
+# An interval longer than this ratio of the capture period counts as a gap
+FRAME_GAP_RATIO = 1.5
+
+# Streaming metrics of one sensor (fixed memory)
+# Frame sink that tracks the inter-frame interval against the configured capture period, gaps and
+# estimated drops, frame and byte rates over a window of recent frames, and optionally the callback
+# duration and consumer latency histograms.
+class StreamMetrics:
+    def __init__(self, name, frame_bytes, period_source=None, callback_histogram=None, ring=None, window=64):
+        self.name = name
+        self.frame_bytes = frame_bytes          # Bytes of data per frame, updated on layout changes
+        self.period_source = period_source      # Callable returning capture_period_us (0 if unknown)
+        self.callback_histogram = callback_histogram
+        self.ring = ring
+        self.consumer_latency = LatencyHistogram()
+        if ring is not None:
+            ring.latency_histogram = self.consumer_latency
+
+        # Counters
+        self.frames = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.dropped = 0
+        self.last_timestamp_ns = 0
+        self.max_interval_ns = 0
+        self.interval_counts = [0] * len(FRAME_INTERVAL_RATIOS)
+        self.interval_ratio_sum = 0.0
+        self.interval_sum_ns = 0
+
+        # Arrival times of the last frames
+        self._window = np.zeros(window, dtype=np.int64)
+
+    # Frame sink, called from the sensor callback
+    def push(self, frame, seq, timestamp_ns):
+        self._window[self.frames % len(self._window)] = timestamp_ns
+        if self.frames > 0:
+            interval = timestamp_ns - self.last_timestamp_ns
+            self.interval_sum_ns += interval
+            if interval > self.max_interval_ns:
+                self.max_interval_ns = interval
+
+            period_ns = self.period_ns()
+            if period_ns > 0:
+                ratio = interval / period_ns
+                self.interval_ratio_sum += ratio
+                bucket = 0
+                while ratio > FRAME_INTERVAL_RATIOS[bucket]:
+                    bucket += 1
+                self.interval_counts[bucket] += 1
+                if ratio > FRAME_GAP_RATIO:
+                    self.gaps += 1
+                    self.dropped += max(int(ratio + 0.5) - 1, 0)
+        self.frames += 1
+        self.bytes += self.frame_bytes
+        self.last_timestamp_ns = timestamp_ns
+
+    # Configured capture period (ns), 0 if unknown
+    def period_ns(self):
+        if self.period_source is None:
+            return 0
+        return self.period_source() * 1000
+
+    # Frame rate over the window of recent frames
+    def rate_hz(self):
+        n = min(self.frames, len(self._window))
+        if n < 2:
+            return 0.0
+        newest = self._window[(self.frames - 1) % len(self._window)]
+        oldest = self._window[(self.frames - n) % len(self._window)]
+        if newest <= oldest:
+            return 0.0
+        return (n - 1) * 1e9 / (newest - oldest)
+
+    # Metrics as a dict
+    def snapshot(self):
+        now_ns = time.perf_counter_ns()
+        rate_hz = self.rate_hz()
+        snapshot = {
+            'name': self.name,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'rate_hz': rate_hz,
+            'bytes_per_s': rate_hz * self.frame_bytes,
+            'period_us': self.period_ns() // 1000,
+            'gaps': self.gaps,
+            'dropped': self.dropped,
+            'max_interval_ns': self.max_interval_ns,
+            'last_frame_age_s': (now_ns - self.last_timestamp_ns) * 1e-9 if self.frames > 0 else None,
+            'interval_ratio_buckets': dict(zip(FRAME_INTERVAL_RATIOS, self.interval_counts)),
+            'consumer_latency': self.consumer_latency.snapshot(),
+        }
+        if self.callback_histogram is not None:
+            snapshot['callback_duration'] = self.callback_histogram.snapshot()
+        if self.ring is not None:
+            snapshot['ring'] = self.ring.stats()
+        return snapshot
+
+    # Metrics in Prometheus text format (without HELP/TYPE headers, see prometheus_text)
+    def prometheus_samples(self):
+        labels = f'sensor="{self.name}"'
+        samples = [
+            ('ilidar_frames_total', labels, self.frames),
+            ('ilidar_bytes_total', labels, self.bytes),
+            ('ilidar_frame_gaps_total', labels, self.gaps),
+            ('ilidar_frames_dropped_total', labels, self.dropped),
+            ('ilidar_frame_rate_hz', labels, self.rate_hz()),
+            ('ilidar_capture_period_seconds', labels, self.period_ns() * 1e-9),
+            ('ilidar_frame_interval_max_seconds', labels, self.max_interval_ns * 1e-9),
+        ]
+        if self.frames > 0:
+            samples.append(('ilidar_last_frame_age_seconds', labels, (time.perf_counter_ns() - self.last_timestamp_ns) * 1e-9))
+        if self.ring is not None:
+            ring_stats = self.ring.stats()
+            samples.append(('ilidar_ring_overruns_total', labels, ring_stats['overruns']))
+            samples.append(('ilidar_ring_drops_total', labels, ring_stats['drops']))
+
+        # Histograms
+        cumulative = 0
+        for ratio, count in zip(FRAME_INTERVAL_RATIOS, self.interval_counts):
+            cumulative += count
+            le = '+Inf' if ratio == float('inf') else f'{ratio}'
+            samples.append(('ilidar_frame_interval_ratio_bucket', f'{labels},le="{le}"', cumulative))
+        samples.append(('ilidar_frame_interval_ratio_sum', labels, self.interval_ratio_sum))
+        samples.append(('ilidar_frame_interval_ratio_count', labels, cumulative))
+        histograms = [('ilidar_consumer_latency_seconds', self.consumer_latency)]
+        if self.callback_histogram is not None:
+            histograms.append(('ilidar_callback_duration_seconds', self.callback_histogram))
+        for name, histogram in histograms:
+            cumulative = 0
+            # Every bucket is exposed, so the series set does not change with the observed values
+            for bucket, count in enumerate(histogram.counts[:-1]):
+                cumulative += count
+                samples.append((f'{name}_bucket', f'{labels},le="{(1 << bucket) * 1e-9:.9g}"', cumulative))
+            samples.append((f'{name}_bucket', f'{labels},le="+Inf"', histogram.count))
+            samples.append((f'{name}_sum', labels, histogram.total_ns * 1e-9))
+            samples.append((f'{name}_count', labels, histogram.count))
+        return samples
+
+# Prometheus metric types
+PROMETHEUS_TYPES = {
+    'ilidar_frames_total': 'counter',
+    'ilidar_bytes_total': 'counter',
+    'ilidar_frame_gaps_total': 'counter',
+    'ilidar_frames_dropped_total': 'counter',
+    'ilidar_frame_rate_hz': 'gauge',
+    'ilidar_capture_period_seconds': 'gauge',
+    'ilidar_frame_interval_max_seconds': 'gauge',
+    'ilidar_last_frame_age_seconds': 'gauge',
+    'ilidar_ring_overruns_total': 'counter',
+    'ilidar_ring_drops_total': 'counter',
+    'ilidar_frame_interval_ratio': 'histogram',
+    'ilidar_consumer_latency_seconds': 'histogram',
+    'ilidar_callback_duration_seconds': 'histogram',
+    'ilidar_watchdog_stalls_total': 'counter',
+    'ilidar_watchdog_reconnects_total': 'counter',
+    'ilidar_watchdog_failed_attempts_total': 'counter',
+    'ilidar_watchdog_params_reapplied_total': 'counter',
+    'ilidar_watchdog_last_recovery_seconds': 'gauge',
+    'ilidar_watchdog_downtime_seconds_total': 'counter',
+    'ilidar_watchdog_recovering': 'gauge',
+}
+
+# Prometheus text exposition of many StreamMetrics (or any object with prometheus_samples(), e.g. StallWatchdog)
+def prometheus_text(metrics_list):
+    families = collections.OrderedDict()
+    for metrics in metrics_list:
+        for name, labels, value in metrics.prometheus_samples():
+            family = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in PROMETHEUS_TYPES:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append(f"{name}{{{labels}}} {value}")
+
+    lines = []
+    for family, samples in families.items():
+        lines.append(f"# TYPE {family} {PROMETHEUS_TYPES.get(family, 'untyped')}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+# Local HTTP endpoint serving the Prometheus text of many StreamMetrics at /metrics
+class MetricsServer:
+    def __init__(self, metrics_list, host='127.0.0.1', port=9464):
+        metrics_list = list(metrics_list)
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = prometheus_text(metrics_list).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.metrics_list = metrics_list
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# Async iterator of frames for asyncio
+# The sensor callback copies each frame into a bounded ring and wakes the event loop with
+# call_soon_threadsafe. Wake-ups are coalesced: at most one is pending at a time. With `coalesce`
+# the consumer always receives the newest frame and older unread frames are skipped.
+class AsyncFrameStream:
+    def __init__(self, lidar, maxsize=8, coalesce=False, loop=None):
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        self.lidar = lidar
+        self.loop = loop
+        policy = RING_POLICY_LATEST if coalesce else RING_POLICY_DROP_OLDEST
+        self.ring = FrameRing(max(maxsize, 2), lidar.img.shape, lidar.img.dtype, policy)
+
+        self._event = asyncio.Event()
+        self._wakeup_pending = False
+        self._closed = False
+        lidar.add_sink(self.push)
+
+    # Frame sink, called from the sensor callback
+    def push(self, frame, seq, timestamp_ns):
+        self.ring.push(frame, timestamp_ns)
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            self.loop.call_soon_threadsafe(self._wakeup)
+
+    def _wakeup(self):
+        self._wakeup_pending = False
+        self._event.set()
+
+    def __aiter__(self):
+        return self
+
+    # Next (seq, timestamp_ns, frame), the frame buffer is reused by the next call
+    async def __anext__(self):
+        while not self._closed:
+            item = self.ring.get(timeout=0)
+            if item is not None:
+                return item
+            self._event.clear()
+            await self._event.wait()
+        raise StopAsyncIteration
+
+    # Detach from the sensor and end the iteration
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.lidar.remove_sink(self.push)
+        self.loop.call_soon_threadsafe(self._event.set)
+
+# Poll `read` with exponential backoff until `check(value)` is true
+# Returns (value, ok) with the last value read. `read` is called many times and should not print,
+# e.g. lambda: lidar.get_params(verbose=False).
+def poll_until(read, check, timeout=2.0, interval=0.01, max_interval=0.2):
+    deadline = time.perf_counter() + timeout
+    while True:
+        value = read()
+        if value is not None and check(value):
+            return value, True
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return value, False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+# Interval of sending the parameters again while set_params() waits for the read-back
+SET_PARAMS_RETRY_S = 0.5
 
 # Main class starts here
 class iTFS:
     def __init__(self, dll_path):
         # Load the DLL
         self.ilidar_wrapper = ctypes.CDLL(dll_path)
-        self.ilidar_clean = False
 
         # Set function prototypes
         self.ilidar_wrapper.ilidar_init.argtypes = [ctypes.POINTER(ctypes.c_uint16), CALLBACK_TYPE]
@@ -511,7 +2421,45 @@ class iTFS:
         self.ilidar_wrapper.ilidar_stop.argtypes = []
         self.ilidar_wrapper.ilidar_stop.restype = ctypes.c_int
 
+        self._init_state()
+
+    # Reset the Python-side state of the wrapper
+    def _init_state(self):
+        self.ilidar_clean = False
         self.iscreated = False
+
+        # Frame buffer, ring and internal callback used by init_ring()
+        self.img = None
+        self.ring = None
+        self.trampoline = None
+
+        # Frame sinks called by the internal callback with (frame, seq, timestamp_ns)
+        self._sinks = []
+
+        # Raw info_v2 block of the last read or written parameters
+        self.params_raw = bytearray(166)
+        self.recorder = None
+
+        # Executor of the awaitable API (one thread, so native calls stay serialized)
+        self._executor = None
+
+        # Latency histogram of each operation (connect, get_params, set_params, ...)
+        self.op_latency = {}
+
+        # Frame layout of the active readout (follows capture_row of the last read or written parameters)
+        self.layout = FrameLayout()
+        self.layout_callbacks = []
+
+        # Streaming metrics (enable_metrics())
+        self.metrics = None
+
+        # Last connected (sensor_ip, sensor_port), stream state and the stall watchdog (start_watchdog())
+        self.sensor_address = None
+        self.streaming = False
+        self.watchdog = None
+
+        # Shared memory frame ring for worker processes (init_shared_ring())
+        self.shared_ring = None
         
     def version(self):
         return ilidar_wrapper_version
@@ -526,6 +2474,162 @@ class iTFS:
             print("Fail to initialize the wrapper class. Check the arguments")
             return False
 
+    # Initialize the wrapper with an internal image buffer and a multi-slot frame ring
+    # Each frame is copied into the ring by the built-in callback (FrameTrampoline), then `callback(ptr)`
+    # is called if given. With `coalesce_interval` (seconds) consumers are signaled at most once per interval.
+    def init_ring(self, n_slots=8, policy=RING_POLICY_DROP_OLDEST, callback=None, coalesce_interval=0.0):
+        self.img = np.zeros((320, 320), dtype=np.uint16)
+        self.ring = FrameRing(n_slots, self.layout.frame_shape, self.img.dtype, policy)
+        if self.layout != FrameLayout():
+            self.ring.set_layout(self.layout)
+        self.trampoline = FrameTrampoline(self.img, self.ring, coalesce_interval, callback)
+        self.trampoline.sinks = self._sinks
+        img_ptr = self.img.ctypes.data_as(ctypes.POINTER(ctypes.c_uint16))
+        return self.init(img_ptr, self.trampoline.ctype_callback)
+
+    # Number of frames received through the built-in callback
+    @property
+    def frame_count(self):
+        if self.trampoline is None:
+            return 0
+        return self.trampoline.count
+
+    # Wait for new frames in the ring (see FrameTrampoline.wait)
+    def wait_frame(self, timeout=None):
+        if self.trampoline is None:
+            return False
+        return self.trampoline.wait(timeout)
+
+    # Statistics of the built-in callback, including the histogram of its duration
+    def callback_stats(self):
+        if self.trampoline is None:
+            return None
+        return self.trampoline.stats()
+
+    # Follow capture_row of the parameters: resize the ring to the compact frames of the new layout and call
+    # the layout callbacks (e.g. to rebuild a reconstructor with layout.crop). Returns True if the layout changed.
+    def _update_layout(self):
+        layout = FrameLayout.from_params(InfoV2(self.params_raw), self.layout.intensity_offset)
+        if layout is None or layout == self.layout:
+            return False
+        self.layout = layout
+        if self.ring is not None:
+            self.ring.set_layout(layout)
+        if self.metrics is not None:
+            self.metrics.frame_bytes = self._frame_bytes()
+        for callback in self.layout_callbacks:
+            callback(layout)
+        return True
+
+    # Bytes of depth and intensity data in a frame of the active layout
+    def _frame_bytes(self):
+        return self.layout.frame_shape[0] * self.layout.frame_shape[1] * self.img.itemsize
+
+    # Register a callback called with the new FrameLayout when capture_row changes
+    def on_layout_change(self, callback):
+        self.layout_callbacks.append(callback)
+
+    # Copy every frame into a SharedFrameRing for worker processes (requires init_ring())
+    # Workers attach with SharedFrameRing.attach(LiDAR.shared_ring.name) or run_shared_worker()
+    def init_shared_ring(self, n_workers=1, fanout=SHARED_FANOUT_BROADCAST, n_slots=8, policy=RING_POLICY_BLOCK, block_timeout=0.005, name=None):
+        if self.trampoline is None:
+            print("Fail to create the shared ring. Initialize the wrapper class with init_ring() first.")
+            return None
+        if self.shared_ring is not None:
+            self.close_shared_ring()
+        self.shared_ring = SharedFrameRing(n_slots, self.img.shape, n_workers, fanout, policy, block_timeout, name)
+        self._shared_sink = lambda frame, seq, timestamp_ns: self.shared_ring.push(frame, timestamp_ns)
+        self.add_sink(self._shared_sink)
+        return self.shared_ring
+
+    # Close the shared ring, workers return once they have drained their frames
+    def close_shared_ring(self):
+        if self.shared_ring is None:
+            return
+        self.remove_sink(self._shared_sink)
+        self.shared_ring.close()
+        self.shared_ring = None
+
+    # Configured capture period from the last read or written parameters (0 if unknown)
+    @property
+    def capture_period_us(self):
+        return int.from_bytes(self.params_raw[87:91], 'little')
+
+    # Attach streaming metrics to the frame callback (requires init_ring())
+    def enable_metrics(self, name=None):
+        if self.trampoline is None:
+            print("Fail to enable metrics. Initialize the wrapper class with init_ring() first.")
+            return None
+        if self.metrics is not None:
+            return self.metrics
+        if name is None:
+            data_sensor_ip = self.params_raw[97:101]
+            name = f"{data_sensor_ip[0]}.{data_sensor_ip[1]}.{data_sensor_ip[2]}.{data_sensor_ip[3]}"
+        self.metrics = StreamMetrics(name, self._frame_bytes(), lambda: self.capture_period_us, self.trampoline.histogram, self.ring)
+        self.add_sink(self.metrics.push)
+        return self.metrics
+
+    # Serve the metrics of this sensor (and of its watchdog) in Prometheus text format at http://host:port/metrics
+    def start_metrics_server(self, host='127.0.0.1', port=9464):
+        metrics = self.enable_metrics()
+        if metrics is None:
+            return None
+        metrics_list = [metrics]
+        if self.watchdog is not None:
+            metrics_list.append(self.watchdog)
+        return MetricsServer(metrics_list, host, port)
+
+    # Reconnect automatically when frames stop arriving (requires init_ring() and a connected sensor)
+    # See StallWatchdog for the options
+    def start_watchdog(self, **kwargs):
+        if self.trampoline is None:
+            print("Fail to start the watchdog. Initialize the wrapper class with init_ring() first.")
+            return None
+        if self.sensor_address is None:
+            print("Fail to start the watchdog. Connect to the sensor first.")
+            return None
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        self.watchdog = StallWatchdog(self, self.sensor_address[0], self.sensor_address[1], **kwargs)
+        self.watchdog.start()
+        return self.watchdog
+
+    def stop_watchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+
+    # Add a frame sink called with (frame, seq, timestamp_ns) on every frame stored in the ring
+    # `seq` is the ring sequence number, frames rejected by a RING_POLICY_BLOCK ring are not passed
+    def add_sink(self, sink):
+        self._sinks = self._sinks + [sink]
+        if self.trampoline is not None:
+            self.trampoline.sinks = self._sinks
+
+    # Remove a frame sink
+    def remove_sink(self, sink):
+        self._sinks = [s for s in self._sinks if s != sink]
+        if self.trampoline is not None:
+            self.trampoline.sinks = self._sinks
+
+    # Start recording the raw frames to a file (requires init_ring())
+    def start_recording(self, file_path, n_slots=64, chunk_frames=16):
+        if self.ring is None:
+            print("Fail to start recording. Initialize the wrapper class with init_ring() first.")
+            return False
+        if self.recorder is not None:
+            self.stop_recording()
+        self.recorder = FrameRecorder(file_path, self.img.shape, n_slots, chunk_frames, lambda: self.params_raw)
+        self.add_sink(self.recorder.push)
+        return True
+
+    # Stop recording and close the file
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        self.remove_sink(self.recorder.push)
+        self.recorder.close()
+        self.recorder = None
+
     def create(self, dest_ip, dest_port):
         print("Creating interface...")
         host_ip_list = get_ip_list()
@@ -564,17 +2668,22 @@ class iTFS:
     def destroy(self):
         print("Destroying interface...")
         self.ilidar_wrapper.ilidar_destroy()
+        # Join the worker thread of the awaitable API
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
         self.ilidar_clean = True
         print("  Done.")
         
     def isclean(self):
         return self.ilidar_clean
 
-    def connect(self, sensor_ip, sensor_port):
+    # Connect to the sensor, with a timeout wait until the sensor answers a parameter read
+    def connect(self, sensor_ip, sensor_port, timeout=None):
         if self.iscreated == False:
             print("Incoming IP adress is not set. Try to creating interface with default values...")
-            host_ip_list = get_ip_list()
-            dest_ip = [ip for ip in host_ip_list if ipaddress.ip_address(sensor_ip) in ipaddress.ip_network(ip + "/" + get_subnet_mask(ip), strict=False)]
+            dest_ip = [interface.ip for interface in get_interfaces() if interface.ip != '127.0.0.1' and is_ip(interface.netmask)
+                       and ipaddress.ip_address(sensor_ip) in ipaddress.ip_network(interface.ip + "/" + interface.netmask, strict=False)]
 
             if len(dest_ip) > 0:
                 listening_ip = dest_ip[0]
@@ -595,10 +2704,16 @@ class iTFS:
                 return False
 
         print("Connecting to sensor...")
+        start_ns = time.perf_counter_ns()
         result = self.ilidar_wrapper.ilidar_connect(get_ip_array(sensor_ip), ctypes.c_uint16(sensor_port))
         if result != 0:
             print("Fail to connect to the sensor. The sensor may be used by other users.")
             return False
+        if timeout is not None and self.get_params(timeout) is None:
+            print("Fail to get a response from the sensor. Check the connection.")
+            return False
+        self._record_latency('connect', start_ns)
+        self.sensor_address = (sensor_ip, sensor_port)
         print("  Done.")
         return True
 
@@ -607,24 +2722,88 @@ class iTFS:
         self.ilidar_wrapper.ilidar_disconnect()
         print("  Done.")
 
-    def get_params(self):
+    # Read the raw info_v2 block, None if the library reports an error
+    def _read_params(self):
         output_buffer_ctypes = (ctypes.c_uint8 * 166)()
         result = self.ilidar_wrapper.ilidar_get_params(output_buffer_ctypes)
         if result != 0:
-            print("Fail to get parameters from the sensor. Check the connection.")
             return None
-        
-        params = decode_info_v2(bytearray(output_buffer_ctypes))
+        return bytearray(output_buffer_ctypes)
+
+    # Get parameters from the sensor
+    # timeout=None: single read, timeout=0: non-blocking check that returns None until the sensor has
+    # answered, timeout>0: poll with backoff until the sensor has answered or the timeout expires.
+    # verbose=False skips the failure message, e.g. when get_params is the reader of poll_until().
+    def get_params(self, timeout=None, verbose=True):
+        start_ns = time.perf_counter_ns()
+        if timeout is None:
+            params_raw = self._read_params()
+            if params_raw is None:
+                if verbose:
+                    print("Fail to get parameters from the sensor. Check the connection.")
+                return None
+        else:
+            params_raw, ready = poll_until(self._read_params, any, timeout)
+            if not ready:
+                if verbose and timeout > 0:
+                    print("Fail to get parameters from the sensor. Check the connection.")
+                return None
+        self._record_latency('get_params', start_ns)
+
+        self.params_raw = params_raw
+        self._update_layout()
+        params = decode_info_v2(self.params_raw)
         return params
-        
-    def set_params(self, params):
-        input_buffer = encode_info_v2(params)
-        input_buffer_ctypes = (ctypes.c_uint8 * 166).from_buffer_copy(input_buffer)
-        result = self.ilidar_wrapper.ilidar_set_params(input_buffer_ctypes)
-        if result != 0:
-            print("Fail to set parameters from the sensor. Check the connection.")
+
+    # Set parameters of the sensor
+    # With a timeout, the call returns once the read-back matches `params` (False if it does not in time).
+    def set_params(self, params, timeout=None):
+        start_ns = time.perf_counter_ns()
+        result = self._write_params(params, timeout)
+        if result['error'] != '':
+            # A non-blocking check (timeout=0) fails quietly when the read-back does not match yet
+            if timeout != 0 or result['attempts'] == 0:
+                print(result['error'])
             return False
+        self._record_latency('set_params', start_ns)
         return True
+
+    # Write the parameters and, with a timeout, confirm them by read-back
+    # The parameters are sent again every `retry_s` until the fields `names` (default: all parameters)
+    # read back as written. Returns {'attempts', 'readback', 'error'}, error is '' on success.
+    def _write_params(self, params, timeout=None, retry_s=SET_PARAMS_RETRY_S, names=None):
+        deadline = time.perf_counter() + (timeout if timeout is not None else 0.0)
+        input_buffer = encode_info_v2(params)
+        input_buffer_ctypes = (ctypes.c_uint8 * 166).from_buffer_copy(input_buffer)
+        result = {'attempts': 0, 'readback': None, 'error': ''}
+        while True:
+            if self.ilidar_wrapper.ilidar_set_params(input_buffer_ctypes) != 0:
+                result['error'] = "Fail to set parameters from the sensor. Check the connection."
+                return result
+            result['attempts'] += 1
+            params_raw = bytearray(self.params_raw)
+            params_raw[71:165] = input_buffer[71:165]
+            self.params_raw = params_raw
+            if timeout is None:
+                break
+
+            # Confirm by read-back, the parameters are sent again if the sensor has not taken them
+            remaining = deadline - time.perf_counter()
+            readback, confirmed = poll_until(self._read_params, lambda raw: len(diff_info_v2(InfoV2(raw), params, names)) == 0,
+                                             min(retry_s, max(remaining, 0.0)))
+            if readback is not None:
+                result['readback'] = decode_info_v2(readback)
+            if confirmed:
+                self.params_raw = readback
+                break
+            if time.perf_counter() >= deadline:
+                if readback is None:
+                    result['error'] = "Fail to confirm the parameters of the sensor (no read-back). Check the connection."
+                else:
+                    result['error'] = f"Fail to confirm the parameters of the sensor (read-back mismatch: {diff_info_v2(InfoV2(readback), params, names)})."
+                return result
+        self._update_layout()
+        return result
     
     def print_params(self, params):
         print_info_v2(params)
@@ -633,17 +2812,962 @@ class iTFS:
         print_diff_info_v2(pri, post)
 
     def store(self):
+        start_ns = time.perf_counter_ns()
         self.ilidar_wrapper.ilidar_store()
+        self._record_latency('store', start_ns)
 
-    def lock(self):
-        self.ilidar_wrapper.ilidar_lock()
+    # Lock the sensor parameters, with a timeout wait until the lock flag is reported
+    def lock(self, timeout=None):
+        return self._set_lock(True, timeout)
 
-    def unlock(self):
-        self.ilidar_wrapper.ilidar_unlock()
+    # Unlock the sensor parameters, with a timeout wait until the lock flag is cleared
+    def unlock(self, timeout=None):
+        return self._set_lock(False, timeout)
 
-    def start(self):
+    def _set_lock(self, lock, timeout):
+        start_ns = time.perf_counter_ns()
+        if lock:
+            self.ilidar_wrapper.ilidar_lock()
+        else:
+            self.ilidar_wrapper.ilidar_unlock()
+        if timeout is not None:
+            readback, confirmed = poll_until(self._read_params, lambda raw: raw[165] == int(lock), timeout)
+            if not confirmed:
+                return False
+        self._record_latency('lock' if lock else 'unlock', start_ns)
+        return True
+
+    # Start the data stream, with a timeout (and init_ring()) wait for the first frame
+    def start(self, timeout=None):
+        start_ns = time.perf_counter_ns()
+        frame_count = self.frame_count
         self.ilidar_wrapper.ilidar_start()
+        self.streaming = True
+        if timeout is not None and self.trampoline is not None:
+            count, started = poll_until(lambda: self.frame_count, lambda count: count > frame_count, timeout, 0.001, 0.01)
+            if not started:
+                if timeout > 0:
+                    print("Fail to receive the first frame from the sensor. Check the connection.")
+                return False
+            self._record_latency('first_frame', start_ns)
+        return True
 
     def stop(self):
         self.ilidar_wrapper.ilidar_stop()
-    
\ No newline at end of file
+        self.streaming = False
+
+    # Record the latency of an operation
+    def _record_latency(self, name, start_ns):
+        histogram = self.op_latency.get(name)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.op_latency[name] = histogram
+        histogram.add(time.perf_counter_ns() - start_ns)
+
+    # Latency statistics of every operation
+    def op_stats(self):
+        return {name: histogram.snapshot() for name, histogram in self.op_latency.items()}
+
+    # Async iterator of frames (requires init_ring()), use as `async for seq, timestamp_ns, frame in lidar.frames()`
+    def frames(self, maxsize=8, coalesce=False):
+        if self.ring is None:
+            print("Fail to stream frames. Initialize the wrapper class with init_ring() first.")
+            return None
+        return AsyncFrameStream(self, maxsize, coalesce)
+
+    # Run a blocking method on the dedicated executor of this sensor
+    def _run_async(self, func, *args):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ilidar")
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def aconnect(self, sensor_ip, sensor_port, timeout=None):
+        return await self._run_async(self.connect, sensor_ip, sensor_port, timeout)
+
+    async def adisconnect(self):
+        return await self._run_async(self.disconnect)
+
+    async def aget_params(self, timeout=None, verbose=True):
+        return await self._run_async(self.get_params, timeout, verbose)
+
+    async def aset_params(self, params, timeout=None):
+        return await self._run_async(self.set_params, params, timeout)
+
+    async def astore(self):
+        return await self._run_async(self.store)
+
+    async def astart(self, timeout=None):
+        return await self._run_async(self.start, timeout)
+
+    async def astop(self):
+        return await self._run_async(self.stop)
+    
+# Default parameter memory of the simulated sensor
+SIMULATOR_DEFAULT_PARAMS = {
+    'sensor_sn': 1,
+    'capture_mode': 2,
+    'capture_row': 160,
+    'capture_shutter': [400, 80, 16, 0, 8000],
+    'capture_limit': [200, 200],
+    'capture_period_us': 100000,
+    'capture_seq': 0,
+    'data_output': 7,
+    'data_baud': 115200,
+    'data_sensor_ip': [192, 168, 5, 116],
+    'data_dest_ip': [192, 168, 5, 5],
+    'data_subnet': [255, 255, 255, 0],
+    'data_gateway': [192, 168, 5, 1],
+    'data_port': 7256,
+    'data_mac_addr': [10, 1, 0, 4, 2, 116],
+    'sync': 1,
+    'sync_trig_delay_us': 2540,
+    'sync_ill_delay_us': [4760, 4760, 4760, 4580, 4760, 4760, 4760, 7844, 1650, 1650, 1650, 0, 0, 0, 0],
+    'sync_trig_trim_us': 4,
+    'sync_ill_trim_us': 2,
+    'sync_output_delay_us': 0,
+    'arb': 0,
+    'arb_timeout': 300000,
+}
+
+# Make synthetic 320x320 uint16 frames (depth rows 0:160 in mm, intensity rows 160:320)
+def make_synthetic_frames(n_frames=8, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.arange(160, dtype=np.float64).reshape(-1, 1)
+    frames = np.zeros((n_frames, 320, 320), dtype=np.uint16)
+    for i in range(n_frames):
+        # Tilted floor with a moving box
+        depth = np.repeat(1500.0 + 25.0 * (160 - rows), 320, axis=1)
+        box_col = int(40 + (240 * i) // max(n_frames, 1))
+        depth[50:110, box_col:box_col + 40] = 1200.0
+        depth += rng.normal(0.0, 10.0, depth.shape)
+        intensity = 16000.0 * np.exp(-depth / 4000.0) + rng.normal(0.0, 50.0, depth.shape)
+        frames[i, :160, :] = np.clip(depth, 0, 65535)
+        frames[i, 160:, :] = np.clip(intensity, 0, 65535)
+    return frames
+
+# Native-like stand-in for libilidar used by iTFSSimulator
+# Frames are written into the registered image buffer and the registered CALLBACK_TYPE callback is called
+# from a background thread every `capture_period_us` (read from the parameter memory), with optional
+# jitter, bursts and stalls.
+class SimulatedLibrary:
+    def __init__(self, frames=None, params=None, jitter_us=0, burst_prob=0.0, burst_len=4, stall_prob=0.0, stall_s=1.0, seed=None, response_delay_s=0.0):
+        if frames is None:
+            frames = make_synthetic_frames()
+        frames = np.asarray(frames, dtype=np.uint16)
+        if frames.ndim == 2:
+            frames = frames.reshape((1,) + frames.shape)
+        self.frames = frames
+
+        if params is None:
+            params = SIMULATOR_DEFAULT_PARAMS
+        self.params_mem = encode_info_v2(params)
+        self.stored_mem = bytearray(self.params_mem)
+
+        # Fault injection
+        self.jitter_us = jitter_us
+        self.burst_prob = burst_prob
+        self.burst_len = burst_len
+        self.stall_prob = stall_prob
+        self.stall_s = stall_s
+        self._rng = random.Random(seed)
+
+        # Delay of the sensor answers: get_params reads zeros until the sensor has answered after
+        # connect, and writes to the parameter memory take effect after the delay
+        self.response_delay_s = response_delay_s
+        self._answer_time = 0.0
+        self._pending_writes = []
+
+        # Counters
+        self.frames_sent = 0
+        self.bursts = 0
+        self.stalls = 0
+
+        self.connected = False
+        self._img_ptr = None
+        self._callback = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def ilidar_init(self, img_ptr, callback):
+        if img_ptr is None or callback is None:
+            return -1
+        self._img_ptr = img_ptr
+        self._callback = callback
+        return 0
+
+    def ilidar_create(self, broadcast_ip, listening_ip, listening_port):
+        return 0
+
+    def ilidar_destroy(self):
+        self.ilidar_stop()
+        return 0
+
+    def ilidar_connect(self, sensor_ip, sensor_port):
+        self.params_mem[97:101] = bytes(sensor_ip)
+        self._answer_time = time.perf_counter() + self.response_delay_s
+        self.connected = True
+        return 0
+
+    def ilidar_disconnect(self):
+        self.ilidar_stop()
+        self.connected = False
+        return 0
+
+    def ilidar_get_params(self, dst):
+        if not self.connected:
+            return -1
+        if time.perf_counter() < self._answer_time:
+            ctypes.memmove(dst, bytes(166), 166)
+            return 0
+        self._apply_writes()
+        ctypes.memmove(dst, bytes(self.params_mem), 166)
+        return 0
+
+    def ilidar_set_params(self, src):
+        if not self.connected:
+            return -1
+        # Only the writable region (capture_mode to arb_timeout) is taken, the rest is read only
+        self._write(71, bytes(src)[71:165])
+        return 0
+
+    def ilidar_store(self):
+        self._apply_writes()
+        self.stored_mem = bytearray(self.params_mem)
+        return 0
+
+    def ilidar_lock(self):
+        self._write(165, b'\x01')
+        return 0
+
+    def ilidar_unlock(self):
+        self._write(165, b'\x00')
+        return 0
+
+    # Write into the parameter memory after the response delay
+    def _write(self, offset, data):
+        self._pending_writes.append((time.perf_counter() + self.response_delay_s, offset, data))
+        self._apply_writes()
+
+    def _apply_writes(self):
+        now = time.perf_counter()
+        while len(self._pending_writes) > 0 and self._pending_writes[0][0] <= now:
+            apply_time, offset, data = self._pending_writes.pop(0)
+            self.params_mem[offset:offset + len(data)] = data
+
+    def ilidar_start(self):
+        if self._callback is None or not self.connected:
+            return -1
+        if self._thread is not None and self._thread.is_alive():
+            return 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return 0
+
+    def ilidar_stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        return 0
+
+    # Capture period from the parameter memory
+    def period_s(self):
+        return int.from_bytes(self.params_mem[87:91], 'little') * 1e-6
+
+    # Write the next frame into the image buffer and notify
+    def _emit(self):
+        frame = np.ascontiguousarray(self.frames[self.frames_sent % len(self.frames)])
+        ctypes.memmove(self._img_ptr, frame.ctypes.data, frame.nbytes)
+        self.frames_sent += 1
+        self._callback(self._img_ptr)
+
+    # Frame thread
+    def _run(self):
+        next_time = time.perf_counter()
+        burst_left = 0
+        while not self._stop_event.is_set():
+            self._emit()
+
+            if burst_left > 0:
+                burst_left -= 1
+                continue
+            if self.burst_prob > 0 and self._rng.random() < self.burst_prob:
+                self.bursts += 1
+                burst_left = self.burst_len - 1
+                continue
+
+            next_time += self.period_s()
+            if self.jitter_us > 0:
+                next_time += self._rng.uniform(-self.jitter_us, self.jitter_us) * 1e-6
+            if self.stall_prob > 0 and self._rng.random() < self.stall_prob:
+                self.stalls += 1
+                next_time += self.stall_s
+
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_time = time.perf_counter()
+
+# Sensor simulator with the same interface as iTFS (no hardware or network needed)
+class iTFSSimulator(iTFS):
+    def __init__(self, frames=None, params=None, jitter_us=0, burst_prob=0.0, burst_len=4, stall_prob=0.0, stall_s=1.0, seed=None, response_delay_s=0.0):
+        self.ilidar_wrapper = SimulatedLibrary(frames, params, jitter_us, burst_prob, burst_len, stall_prob, stall_s, seed, response_delay_s)
+        self._init_state()
+        self.iscreated = True
+
+# Replay modes
+REPLAY_MODE_REALTIME = 'realtime'   # Honour the recorded timestamps (scaled by `speed`)
+REPLAY_MODE_FIXED = 'fixed'         # Fixed frame rate `rate_hz` (default: recorded capture_period_us)
+REPLAY_MODE_FAST = 'fast'           # As fast as possible
+REPLAY_MODES = (REPLAY_MODE_REALTIME, REPLAY_MODE_FIXED, REPLAY_MODE_FAST)
+
+# Native-like stand-in for libilidar that replays a FrameRecording
+class ReplayLibrary(SimulatedLibrary):
+    def __init__(self, recording, mode=REPLAY_MODE_REALTIME, rate_hz=None, speed=1.0, loop=False):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode: {mode}")
+        if len(recording) == 0:
+            raise ValueError(f"Empty recording: {recording.file_path}")
+        super().__init__(recording.frames)
+        self.recording = recording
+        self.params_mem = bytearray(recording.records['params'][0])
+        self.stored_mem = bytearray(self.params_mem)
+        self.connected = True
+
+        self.mode = mode
+        self.rate_hz = rate_hz
+        self.speed = speed
+        self.loop = loop
+        self.position = 0
+        self.seek_generation = 0    # Incremented by seek(), schedule() re-anchors its clock when it changes
+        self.finished = threading.Event()
+
+    # Move to a frame index
+    def seek(self, index):
+        self.position = min(max(int(index), 0), len(self.recording))
+        self.seek_generation += 1
+
+    # Move to the first frame recorded at or after a host timestamp
+    def seek_time(self, timestamp_ns):
+        self.seek(np.searchsorted(self.recording.timestamps, timestamp_ns))
+
+    # Yield frame indices from the current position, waiting according to the replay mode
+    def schedule(self, stop_event=None):
+        timestamps = self.recording.timestamps
+        if self.rate_hz is not None:
+            period = 1.0 / self.rate_hz
+        else:
+            period = self.period_s()
+        generation = None
+
+        while stop_event is None or not stop_event.is_set():
+            if self.position >= len(self.recording):
+                if not self.loop:
+                    break
+                self.position = 0
+                generation = None
+
+            # Pacing reference, reset at start, on loop and after a seek
+            if generation != self.seek_generation:
+                generation = self.seek_generation
+                start_time = time.perf_counter()
+                start_position = self.position
+                count = 0
+
+            if self.mode == REPLAY_MODE_REALTIME:
+                target = start_time + (int(timestamps[self.position]) - int(timestamps[start_position])) * 1e-9 / self.speed
+            elif self.mode == REPLAY_MODE_FIXED:
+                target = start_time + count * period
+            else:
+                target = 0.0
+
+            delay = target - time.perf_counter()
+            if delay > 0:
+                if stop_event is not None:
+                    if stop_event.wait(delay):
+                        break
+                else:
+                    time.sleep(delay)
+                # Seeked while waiting: pace from the new position
+                if generation != self.seek_generation:
+                    continue
+
+            index = self.position
+            self.position += 1
+            count += 1
+            yield index
+
+    # Write a recorded frame into the image buffer and notify
+    def _emit(self, index):
+        frame = self.frames[index]
+        ctypes.memmove(self._img_ptr, frame.ctypes.data, frame.nbytes)
+        self.frames_sent += 1
+        self._callback(self._img_ptr)
+
+    # Frame thread
+    def _run(self):
+        self.finished.clear()
+        for index in self.schedule(self._stop_event):
+            self._emit(index)
+        self.finished.set()
+
+# Replay of a recording file with the same interface as iTFS
+# Frames are delivered through the callback into the image buffer after start(), or by iterating
+# over the replay object, which yields (seq, timestamp_ns, frame) views of the recording.
+class iTFSReplay(iTFS):
+    def __init__(self, recording, mode=REPLAY_MODE_REALTIME, rate_hz=None, speed=1.0, loop=False):
+        if not isinstance(recording, FrameRecording):
+            recording = FrameRecording(recording)
+        self.recording = recording
+        self.ilidar_wrapper = ReplayLibrary(recording, mode, rate_hz, speed, loop)
+        self._init_state()
+        self.iscreated = True
+
+    def __len__(self):
+        return len(self.recording)
+
+    def __iter__(self):
+        for index in self.ilidar_wrapper.schedule():
+            yield int(self.recording.seqs[index]), int(self.recording.timestamps[index]), self.recording.frames[index]
+
+    # Move to a frame index
+    def seek(self, index):
+        self.ilidar_wrapper.seek(index)
+
+    # Move to the first frame recorded at or after a host timestamp
+    def seek_time(self, timestamp_ns):
+        self.ilidar_wrapper.seek_time(timestamp_ns)
+
+    # Current frame index
+    def tell(self):
+        return self.ilidar_wrapper.position
+
+    # Wait until the callback delivery reaches the end of the recording
+    def wait_finished(self, timeout=None):
+        return self.ilidar_wrapper.finished.wait(timeout)
+
+# Per-sensor frame stream of iTFSManager
+class SensorStream:
+    def __init__(self, index, sensor_ip, sensor_port, n_slots=8, policy=RING_POLICY_DROP_OLDEST):
+        self.index = index
+        self.sensor_ip = sensor_ip
+        self.sensor_port = sensor_port
+        self.ring = FrameRing(n_slots, (320, 320), np.uint16, policy)
+        self.connected = False
+
+        # Statistics
+        self.frames = 0
+        self.first_timestamp_ns = 0
+        self.last_timestamp_ns = 0
+        self.period_ns = 0.0        # Smoothed inter-frame interval
+
+    # Store a frame of this sensor (called from the sensor callback)
+    def push(self, frame, timestamp_ns):
+        if self.frames == 0:
+            self.first_timestamp_ns = timestamp_ns
+        else:
+            interval = timestamp_ns - self.last_timestamp_ns
+            if self.period_ns == 0.0:
+                self.period_ns = float(interval)
+            else:
+                self.period_ns += 0.1 * (interval - self.period_ns)
+        self.last_timestamp_ns = timestamp_ns
+        self.frames += 1
+        self.ring.push(frame, timestamp_ns)
+
+    # Copy the next frame of this sensor out of its ring
+    def get(self, timeout=None, out=None):
+        return self.ring.get(timeout, out)
+
+    # Statistics snapshot
+    def stats(self):
+        stats = {
+            'index': self.index,
+            'sensor_ip': self.sensor_ip,
+            'connected': self.connected,
+            'frames': self.frames,
+            'rate_hz': 1e9 / self.period_ns if self.period_ns > 0 else 0.0,
+        }
+        ring_stats = self.ring.stats()
+        stats['pending'] = ring_stats['pending']
+        stats['overruns'] = ring_stats['overruns']
+        stats['drops'] = ring_stats['drops']
+        return stats
+
+# Manager of many sensors with a frame ring per device
+# `lidars` is a list of iTFS-like interfaces, one per sensor. The native library keeps a single
+# sensor connection and gives the callback only the image pointer, so the frames of two sensors on
+# one library cannot be told apart: every interface must have its own native state (its own library
+# instance, a simulator or a replay), otherwise init() raises ValueError.
+# All devices share one contiguous (S, 320, 320) buffer, `frames`; the callback of interface i
+# writes and routes only device i.
+class iTFSManager:
+    def __init__(self, lidars, sensors, n_slots=8, policy=RING_POLICY_DROP_OLDEST):
+        if not isinstance(lidars, (list, tuple)):
+            lidars = [lidars]
+        sensors = [(sensor, 7257) if isinstance(sensor, str) else tuple(sensor) for sensor in sensors]
+        if len(lidars) != len(sensors):
+            raise ValueError("iTFSManager needs one interface per sensor (concurrent sensors on one native library are not supported)")
+
+        self.lidars = list(lidars)
+        self.streams = [SensorStream(i, ip, port, n_slots, policy) for i, (ip, port) in enumerate(sensors)]
+        self.frames = np.zeros((len(self.streams), 320, 320), dtype=np.uint16)
+        self._callbacks = []
+
+    def __len__(self):
+        return len(self.streams)
+
+    def __getitem__(self, index):
+        return self.streams[index]
+
+    # Initialize every interface with its device frame and callback
+    def init(self):
+        check_distinct_libraries(self.lidars, "iTFSManager interfaces")
+
+        for device, (lidar, stream) in enumerate(zip(self.lidars, self.streams)):
+            callback = CALLBACK_TYPE(self._make_callback(self.frames[device], stream))
+            self._callbacks.append(callback)
+            if lidar.init(self.frames[device].ctypes.data_as(ctypes.POINTER(ctypes.c_uint16)), callback) == False:
+                return False
+        return True
+
+    def _make_callback(self, frame, stream):
+        def callback(ptr):
+            stream.push(frame, time.perf_counter_ns())
+
+        return callback
+
+    # Connect every sensor in device order, returns the list of results
+    def connect(self):
+        results = []
+        for lidar, stream in zip(self.lidars, self.streams):
+            stream.connected = lidar.connect(stream.sensor_ip, stream.sensor_port) != False
+            results.append(stream.connected)
+        return results
+
+    def disconnect(self):
+        for lidar, stream in zip(self.lidars, self.streams):
+            lidar.disconnect()
+            stream.connected = False
+
+    def start(self):
+        for lidar in self.lidars:
+            lidar.start()
+
+    def stop(self):
+        for lidar in self.lidars:
+            lidar.stop()
+
+    # Destroy every interface (also joins their executor threads)
+    def destroy(self):
+        for lidar in self.lidars:
+            lidar.destroy()
+
+    # Stream of a device index or sensor IP
+    def stream(self, key):
+        if isinstance(key, str):
+            for stream in self.streams:
+                if stream.sensor_ip == key:
+                    return stream
+            return None
+        return self.streams[key]
+
+    # Statistics of every sensor
+    def stats(self):
+        return [stream.stats() for stream in self.streams]
+
+# Raise ValueError if some interfaces share a loaded native library
+# The library holds a single sensor connection, so each sensor needs its own library instance.
+def check_distinct_libraries(lidars, what="interfaces"):
+    handles = []
+    for lidar in lidars:
+        wrapper = getattr(lidar, 'ilidar_wrapper', lidar)
+        handles.append(getattr(wrapper, '_handle', id(wrapper)))
+    if len(set(handles)) != len(handles):
+        raise ValueError(f"{what} share a native library instance, which streams one sensor at a time")
+
+# Fleet configuration result status
+FLEET_UNCHANGED = 'unchanged'
+FLEET_APPLIED = 'applied'
+FLEET_FAILED = 'failed'
+
+# Configure one sensor: diff against the current params, write only if needed and confirm by read-back
+# `lidar` must be the only interface using its native library instance while this runs.
+def configure_sensor(lidar, desired, store=True, lock=False, timeout=5.0, confirm_timeout=0.5):
+    start_time = time.perf_counter()
+    result = {'status': FLEET_FAILED, 'changed': [], 'attempts': 0, 'error': '', 'elapsed_s': 0.0}
+
+    unknown = [name for name in desired if name not in INFO_V2_PARAMS]
+    if len(unknown) > 0:
+        result['error'] = f"unknown parameters: {unknown}"
+    else:
+        current = lidar.get_params(verbose=False)
+        if current is None:
+            result['error'] = "no response to get_params"
+        else:
+            target = dict(current)
+            target.update(desired)
+            changed = diff_info_v2(current, target)
+            result['changed'] = changed
+
+            if len(changed) == 0:
+                result['status'] = FLEET_UNCHANGED
+            else:
+                # The sensor is locked again afterwards if it was locked before or `lock` is set and the write succeeded
+                was_locked = current['lock'] != 0
+                lidar.unlock()
+                try:
+                    write = lidar._write_params(target, max(start_time + timeout - time.perf_counter(), 0.0), confirm_timeout, changed)
+                    result['attempts'] = write['attempts']
+                    if write['error'] == '':
+                        if store:
+                            lidar.store()
+                        result['status'] = FLEET_APPLIED
+                    else:
+                        result['error'] = write['error']
+                finally:
+                    if was_locked or (lock and result['status'] == FLEET_APPLIED):
+                        lidar.lock()
+
+    result['elapsed_s'] = time.perf_counter() - start_time
+    return result
+
+# Configure many sensors concurrently
+# `sensors` maps a key (e.g. sensor IP) to a connected iTFS-like object. `desired` is either one dict of
+# parameters for every sensor or a dict mapping the same keys to per-sensor parameter dicts.
+# Sensors that already match are skipped. Returns {key: result} (see configure_sensor).
+# Each sensor needs its own native library instance, ValueError is raised if two of them share one.
+def configure_fleet(sensors, desired, max_workers=8, store=True, lock=False, timeout=5.0, confirm_timeout=0.5):
+    check_distinct_libraries(sensors.values(), "configure_fleet sensors")
+
+    if all(key in sensors for key in desired) and len(desired) > 0 and all(isinstance(value, dict) for value in desired.values()):
+        per_sensor = desired
+    else:
+        per_sensor = {key: desired for key in sensors}
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(configure_sensor, sensors[key], per_sensor[key], store, lock, timeout, confirm_timeout): key
+                   for key in sensors if key in per_sensor}
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = {'status': FLEET_FAILED, 'changed': [], 'attempts': 0, 'error': repr(e), 'elapsed_s': 0.0}
+    return results
+
+# Print function of fleet configuration results
+def print_fleet_results(results):
+    counts = collections.Counter(result['status'] for result in results.values())
+    print(f"Fleet configuration: {counts[FLEET_APPLIED]} applied, {counts[FLEET_UNCHANGED]} unchanged, {counts[FLEET_FAILED]} failed")
+    for key, result in results.items():
+        line = f"  {key}: {result['status']} ({result['elapsed_s'] * 1000:.1f} ms)"
+        if len(result['changed']) > 0:
+            line += f" {', '.join(result['changed'])}"
+        if result['error'] != '':
+            line += f" [{result['error']}]"
+        print(line)
+
+# Watchdog states
+WATCHDOG_RUNNING = 'running'
+WATCHDOG_RECOVERING = 'recovering'
+WATCHDOG_STOPPED = 'stopped'
+
+# Stall watchdog with automatic reconnect
+# A frame stall is declared when no frame has arrived for max(min_stall_s, stall_periods * capture_period_us).
+# Recovery runs stop / disconnect / connect / start with jittered exponential backoff until frames flow
+# again, and re-applies the parameters known before the stall only if the sensor does not already have them.
+# The frame ring, the sinks and the native image buffer of `lidar` are kept, so consumers keep their
+# buffers and subscriptions across the reconnect.
+class StallWatchdog:
+    def __init__(self, lidar, sensor_ip, sensor_port, stall_periods=10, min_stall_s=0.5, check_interval=None,
+                 backoff_s=0.2, max_backoff_s=5.0, connect_timeout=2.0, start_timeout=2.0, params_timeout=2.0):
+        self.lidar = lidar
+        self.sensor_ip = sensor_ip
+        self.sensor_port = sensor_port
+        self.stall_periods = stall_periods
+        self.min_stall_s = min_stall_s
+        self.check_interval = check_interval
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.connect_timeout = connect_timeout
+        self.start_timeout = start_timeout
+        self.params_timeout = params_timeout
+        self.state = WATCHDOG_STOPPED
+
+        # Metrics
+        self.stalls = 0                 # Detected stalls
+        self.reconnects = 0             # Successful recoveries
+        self.failed_attempts = 0        # Recovery attempts that did not bring the stream back
+        self.params_reapplied = 0       # Recoveries that had to re-apply the parameters
+        self.last_recovery_s = 0.0
+        self.downtime_s = 0.0           # Total time from stall detection to the first frame after recovery
+        self.recovery_histogram = LatencyHistogram()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._watch_since_ns = 0
+
+    # Stall threshold in seconds from the configured capture period
+    def stall_timeout_s(self):
+        return max(self.min_stall_s, self.stall_periods * self.lidar.capture_period_us * 1e-6)
+
+    # Time since the last frame (or since watching started) in seconds
+    def silence_s(self):
+        last_ns = max(self.lidar.trampoline.last_timestamp_ns, self._watch_since_ns)
+        return (time.perf_counter_ns() - last_ns) * 1e-9
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._watch_since_ns = time.perf_counter_ns()
+        self.state = WATCHDOG_RUNNING
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.state = WATCHDOG_STOPPED
+
+    # Watch thread (idle while the stream is stopped by the user)
+    def _run(self):
+        while not self._stop_event.is_set():
+            stall_timeout = self.stall_timeout_s()
+            if not self.lidar.streaming:
+                self._watch_since_ns = time.perf_counter_ns()
+            elif self.silence_s() > stall_timeout:
+                self.stalls += 1
+                print(f"[WATCHDOG] No frame from {self.sensor_ip} for {self.silence_s():.2f} s. Reconnecting...")
+                self.recover()
+                continue
+            interval = self.check_interval if self.check_interval is not None else stall_timeout / 4
+            self._stop_event.wait(interval)
+
+    # Reconnect until frames flow again (or the watchdog is stopped), returns True on success
+    def recover(self):
+        self.state = WATCHDOG_RECOVERING
+        start_time = time.perf_counter()
+        last_params = dict(decode_info_v2(self.lidar.params_raw)) if any(self.lidar.params_raw) else None
+        attempt = 0
+        while not self._stop_event.is_set():
+            if self._attempt(last_params):
+                elapsed = time.perf_counter() - start_time
+                self.reconnects += 1
+                self.last_recovery_s = elapsed
+                self.downtime_s += elapsed + self.stall_timeout_s()
+                self.recovery_histogram.add(int(elapsed * 1e9))
+                self._watch_since_ns = time.perf_counter_ns()
+                self.state = WATCHDOG_RUNNING
+                print(f"[WATCHDOG] {self.sensor_ip} recovered in {elapsed:.2f} s ({attempt + 1} attempts).")
+                return True
+
+            # Jittered exponential backoff ("equal jitter": half fixed, half random)
+            self.failed_attempts += 1
+            backoff = min(self.max_backoff_s, self.backoff_s * (2 ** attempt))
+            attempt += 1
+            self._stop_event.wait(backoff / 2 + random.uniform(0.0, backoff / 2))
+        return False
+
+    # One stop / disconnect / connect / (re-apply parameters) / start cycle
+    def _attempt(self, last_params):
+        lidar = self.lidar
+        lidar.stop()
+        lidar.disconnect()
+        if lidar.connect(self.sensor_ip, self.sensor_port, self.connect_timeout) == False:
+            return False
+        if last_params is not None:
+            desired = {name: last_params[name] for name in INFO_V2_PARAMS}
+            result = configure_sensor(lidar, desired, store=False, timeout=self.params_timeout)
+            if result['status'] == FLEET_FAILED:
+                print(f"[WATCHDOG] Fail to re-apply the parameters: {result['error']}")
+                return False
+            if result['status'] == FLEET_APPLIED:
+                self.params_reapplied += 1
+        return lidar.start(self.start_timeout) != False
+
+    # Watchdog metrics
+    def stats(self):
+        return {
+            'state': self.state,
+            'stalls': self.stalls,
+            'reconnects': self.reconnects,
+            'failed_attempts': self.failed_attempts,
+            'params_reapplied': self.params_reapplied,
+            'last_recovery_s': self.last_recovery_s,
+            'downtime_s': self.downtime_s,
+            'recovery': self.recovery_histogram.snapshot(),
+        }
+
+    # Metrics in Prometheus text format (see prometheus_text)
+    def prometheus_samples(self):
+        labels = f'sensor="{self.sensor_ip}"'
+        samples = [
+            ('ilidar_watchdog_stalls_total', labels, self.stalls),
+            ('ilidar_watchdog_reconnects_total', labels, self.reconnects),
+            ('ilidar_watchdog_failed_attempts_total', labels, self.failed_attempts),
+            ('ilidar_watchdog_params_reapplied_total', labels, self.params_reapplied),
+            ('ilidar_watchdog_last_recovery_seconds', labels, self.last_recovery_s),
+            ('ilidar_watchdog_downtime_seconds_total', labels, self.downtime_s),
+            ('ilidar_watchdog_recovering', labels, 1 if self.state == WATCHDOG_RECOVERING else 0),
+        ]
+        return samples
+
+# Sensor found by a discovery scan
+DiscoveredSensor = collections.namedtuple('DiscoveredSensor', ['sensor_ip', 'sensor_sn', 'mac', 'firmware', 'interface', 'params'])
+
+# Sensor packet framing of the native library: STX (A5 5A), packet id (u16), payload length (u16),
+# payload, ETX (A5 5A), little endian
+PACKET_STX = b'\xa5\x5a'
+PACKET_ETX = b'\xa5\x5a'
+PACKET_ID_CMD = 0x0030
+PACKET_ID_STATUS = 0x0010
+PACKET_ID_INFO_V2 = 0x0021
+CMD_READ_INFO = 0x0300                  # The sensor answers with its info_v2 packet
+SENSOR_CMD_PORT = 4906                  # Commands are sent to this port of the sensor (or the broadcast address)
+SENSOR_DATA_PORT = 7257                 # Source port of the sensor packets
+HOST_DATA_PORT = 7256                   # Default data_port, the host port receiving the sensor packets
+
+# Command packet (cmd_t: cmd_id, cmd_msg)
+def encode_cmd_packet(cmd_id, cmd_msg=0):
+    return PACKET_STX + struct.pack('<HHHH', PACKET_ID_CMD, 4, cmd_id, cmd_msg) + PACKET_ETX
+
+# (packet id, payload) of a framed sensor packet, None if the framing is invalid
+def decode_packet(data):
+    if len(data) < 8 or data[:2] != PACKET_STX or data[-2:] != PACKET_ETX:
+        return None
+    packet_id, length = struct.unpack_from('<HH', data, 2)
+    if length != len(data) - 8:
+        return None
+    return packet_id, bytes(data[6:-2])
+
+# Discovery probe: cmd_read_info broadcast to the command port, as the native library requests the sensor info
+# Sensors answer with their info_v2 packet sent to their data_dest_ip:data_port, so only sensors streaming to
+# this host (or to its broadcast address) can be found.
+DISCOVERY_PROBE = encode_cmd_packet(CMD_READ_INFO)
+DISCOVERY_SENSOR_PORT = SENSOR_CMD_PORT
+DISCOVERY_LISTEN_PORT = HOST_DATA_PORT
+DISCOVERY_CACHE_TTL_S = 30.0
+
+# Decoded params of an info_v2 packet, None for any other packet
+def parse_discovery_reply(data):
+    packet = decode_packet(data)
+    if packet is None or packet[0] != PACKET_ID_INFO_V2 or len(packet[1]) != INFO_V2_SIZE:
+        return None
+    return decode_info_v2(bytearray(packet[1]))
+
+# UDP discovery transport: broadcast the probe from one interface and collect the replies until the timeout
+# The replies arrive on the data port (listen_port), which may be shared with a running iTFS (SO_REUSEADDR).
+class UdpDiscoveryTransport:
+    def __init__(self, sensor_port=DISCOVERY_SENSOR_PORT, probe=DISCOVERY_PROBE, parse=parse_discovery_reply, listen_port=DISCOVERY_LISTEN_PORT):
+        self.sensor_port = sensor_port
+        self.probe_payload = probe
+        self.parse = parse
+        self.listen_port = listen_port
+
+    # Discovery cache key of this configuration
+    def cache_key(self):
+        return (self.sensor_port, self.probe_payload, self.parse, self.listen_port)
+
+    # Returns a list of (sender ip, params) received through `interface`
+    def probe(self, interface, broadcast_ip, timeout):
+        replies = []
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((interface.ip, self.listen_port))
+            sock.sendto(self.probe_payload, (broadcast_ip, self.sensor_port))
+            deadline = time.perf_counter() + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, address = sock.recvfrom(4096)
+                except socket.timeout:
+                    break
+                params = self.parse(data)
+                if params is not None:
+                    replies.append((address[0], params))
+        finally:
+            sock.close()
+        return replies
+
+# Discovery cache: key -> (monotonic time, sensors)
+_discovery_cache = {}
+_discovery_cache_lock = threading.Lock()
+
+# Interfaces that can reach sensors (IPv4, not loopback, with a netmask)
+def get_discovery_interfaces():
+    return [interface for interface in get_interfaces()
+            if interface.ip != '127.0.0.1' and is_ip(interface.netmask)]
+
+# DiscoveredSensor from a reply
+def _discovered_sensor(sender_ip, params, interface):
+    fw_ver = params['sensor_fw_ver']
+    return DiscoveredSensor(
+        sensor_ip=format_info_v2('data_sensor_ip', params['data_sensor_ip']) if any(params['data_sensor_ip']) else sender_ip,
+        sensor_sn=params['sensor_sn'],
+        mac=format_info_v2('data_mac_addr', params['data_mac_addr']),
+        firmware=f"{fw_ver[0]}.{fw_ver[1]}.{fw_ver[2]}",
+        interface=interface.name,
+        params=params,
+    )
+
+# Find the sensors on all host interfaces (or `interfaces`), probing every interface concurrently
+# Results are cached for `ttl` seconds per transport configuration (transport.cache_key(), transports
+# without it are not cached) and interface list; refresh=True probes again. Sensors answering on several
+# interfaces are listed once, sorted by IP.
+def discover_sensors(timeout=1.0, transport=None, interfaces=None, ttl=DISCOVERY_CACHE_TTL_S, refresh=False):
+    if transport is None:
+        transport = UdpDiscoveryTransport()
+    if interfaces is None:
+        interfaces = get_discovery_interfaces()
+
+    key = None
+    if hasattr(transport, 'cache_key'):
+        key = (transport.cache_key(), tuple(interfaces))
+    with _discovery_cache_lock:
+        cached = _discovery_cache.get(key) if key is not None else None
+        if cached is not None and not refresh and time.monotonic() - cached[0] < ttl:
+            return list(cached[1])
+
+    sensors = {}
+    if len(interfaces) > 0:
+        def probe(interface):
+            try:
+                return interface, transport.probe(interface, get_broadcast_ip(interface.ip, interface.netmask), timeout)
+            except OSError as e:
+                print(f"Fail to probe the interface {interface.name} ({interface.ip}): {e}")
+                return interface, []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(interfaces)) as executor:
+            for interface, replies in executor.map(probe, interfaces):
+                for sender_ip, params in replies:
+                    sensor = _discovered_sensor(sender_ip, params, interface)
+                    sensors.setdefault(sensor.sensor_ip, sensor)
+
+    result = sorted(sensors.values(), key=lambda sensor: ipaddress.ip_address(sensor.sensor_ip))
+    if key is not None:
+        with _discovery_cache_lock:
+            _discovery_cache[key] = (time.monotonic(), result)
+    return list(result)
+
+# Drop the cached discovery results
+def invalidate_discovery():
+    with _discovery_cache_lock:
+        _discovery_cache.clear()
+
+# Print discovered sensors
+def print_discovered_sensors(sensors):
+    print(f"Discovered sensors: {len(sensors)}")
+    for sensor in sensors:
+        print(f"  {sensor.sensor_ip} (SN {sensor.sensor_sn}, MAC {sensor.mac}, FW {sensor.firmware}) on {sensor.interface}")
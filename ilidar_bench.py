@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import numpy as np
+import ilidar
+
+# Benchmark suite of the per-frame paths of ilidar.py
+# Runs offline (no sensor, no native library) with the bundled intrinsic tables and synthetic frames.
+#   $ python -m ilidar_bench                                  # print the results
+#   $ python -m ilidar_bench -o result.json                   # store the results
+#   $ python -m ilidar_bench --baseline result.json           # compare against a stored run
+
+bench_version = 1
+
+# Directory of the bundled .dat files
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Time a callable, returns per-call statistics over `repeat` runs of `number` calls
+def measure(func, repeat=7, number=None, min_run_s=0.05):
+    # Calibrate the number of calls per run
+    if number is None:
+        number = 1
+        while True:
+            start_ns = time.perf_counter_ns()
+            for _ in range(number):
+                func()
+            elapsed_s = (time.perf_counter_ns() - start_ns) * 1e-9
+            if elapsed_s >= min_run_s or number >= 1 << 20:
+                break
+            number *= 2 if elapsed_s <= 0 else max(2, min(10, int(min_run_s / elapsed_s) + 1))
+
+    runs_us = []
+    for _ in range(repeat):
+        start_ns = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        runs_us.append((time.perf_counter_ns() - start_ns) * 1e-3 / number)
+
+    runs_us = np.array(runs_us)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min_us': float(runs_us.min()),
+        'median_us': float(np.median(runs_us)),
+        'mean_us': float(runs_us.mean()),
+        'stdev_us': float(runs_us.std()),
+        'ops_per_s': float(1e6 / runs_us.min()) if runs_us.min() > 0 else 0.0,
+    }
+
+# Machine and library information stored with the results
+def machine_info():
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'open3d': getattr(ilidar.import_open3d(), '__version__', None),
+        'ilidar_wrapper_version': ilidar.ilidar_wrapper_version,
+        'bench_version': bench_version,
+    }
+
+# Synthetic depth image of the first synthetic frame
+def synthetic_depth():
+    return np.ascontiguousarray(ilidar.make_synthetic_frames(1)[0, :160, :])
+
+# info_v2 encoder and decoder
+def bench_codec():
+    params = dict(ilidar.SIMULATOR_DEFAULT_PARAMS)
+    raw = ilidar.encode_info_v2(params)
+    yield 'codec.decode_info_v2', lambda: ilidar.decode_info_v2(raw)
+    yield 'codec.encode_info_v2', lambda: ilidar.encode_info_v2(params)
+    yield 'codec.diff_info_v2', lambda: ilidar.diff_info_v2(params, params)
+
+    block = np.tile(np.frombuffer(raw, dtype=np.uint8), (64, 1))
+    yield 'codec.decode_info_v2_batch_64', lambda: ilidar.decode_info_v2_batch(block)
+
+# Depth to point cloud, as in open3d_example.py
+def bench_reconstruct():
+    depth = synthetic_depth()
+    vec = ilidar.read_intrinsic(os.path.join(DATA_DIR, "iTFS-110.dat"))
+
+    # Reference: the allocating expression of the original example
+    vec_3d = ilidar.rotate_intrinsic(vec, 1.0)
+    yield 'reconstruct.reference', lambda: 0.001 * vec_3d * depth.reshape(-1, 1)
+
+    reconstructor = ilidar.PointCloudReconstructor(vec)
+    yield 'reconstruct.all', lambda: reconstructor.reconstruct(depth)
+
+    sparse = depth.copy()
+    sparse[:, ::2] = 0
+    yield 'reconstruct.valid', lambda: reconstructor.reconstruct_valid(depth)
+    yield 'reconstruct.valid_half', lambda: reconstructor.reconstruct_valid(sparse)
+
+    frame = ilidar.make_synthetic_frames(1)[0]
+    point_filter = ilidar.PointCloudFilter(reconstructor, depth_range=(100, 8000), min_intensity=1000, roi=(0, 160, 20, 300))
+    yield 'reconstruct.filter', lambda: point_filter.apply(frame)
+    voxel_filter = ilidar.PointCloudFilter(reconstructor, depth_range=(100, 8000), voxel_size=0.05)
+    yield 'reconstruct.filter_voxel', lambda: voxel_filter.apply(frame)
+
+# Depth and intensity normalization, as in opencv_example.py
+def bench_normalize():
+    frame = ilidar.make_synthetic_frames(1)[0]
+    depth = frame[:160, :]
+    intensity = frame[160:, :]
+    yield 'normalize.depth', lambda: np.clip((depth / 8000) * 255, 0, 255).astype(np.uint8)
+    yield 'normalize.intensity', lambda: np.clip((intensity / 16384) * 255, 0, 255).astype(np.uint8)
+
+    colorizer = ilidar.FrameColorizer()
+    yield 'normalize.colorize_lut', lambda: colorizer.colorize(frame)
+    colorizer_bgr = ilidar.FrameColorizer(depth_colormap='jet', intensity_colormap='gray')
+    yield 'normalize.colorize_lut_bgr', lambda: colorizer_bgr.colorize(frame)
+
+# Temporal depth filters
+def bench_temporal():
+    frames = ilidar.make_synthetic_frames(8)
+    for name, temporal_filter in (('ema', ilidar.TemporalEMAFilter(0.3)), ('ema_gated', ilidar.TemporalEMAFilter(0.3, 150)),
+                                  ('median5', ilidar.TemporalMedianFilter(5)), ('median5_gated', ilidar.TemporalMedianFilter(5, 150))):
+        for frame in frames:
+            temporal_filter.update(frame[:160])
+        yield f'temporal.{name}', lambda temporal_filter=temporal_filter: temporal_filter.update(frames[0, :160])
+
+# Hand-off of reconstructed points to Open3D (skipped without open3d)
+def bench_open3d():
+    o3d = ilidar.import_open3d()
+    if o3d is None:
+        print("open3d is not installed, skipping the open3d group")
+        return
+    reconstructor = ilidar.PointCloudReconstructor.from_file(os.path.join(DATA_DIR, "iTFS-110.dat"))
+    frames = ilidar.make_synthetic_frames(2)
+    points = reconstructor.reconstruct(frames[0, :160]).copy()
+    valid = [reconstructor.reconstruct_valid(frames[i, :160]).copy() for i in range(2)]
+    valid[1] = valid[1][:len(valid[1]) // 2]
+
+    # Reference: a new Vector3dVector from float32 points every frame, as in the original example
+    pcd = o3d.geometry.PointCloud()
+    def reference():
+        pcd.points = o3d.utility.Vector3dVector(points)
+    yield 'open3d.reference', reference
+
+    for mode in ilidar.OPEN3D_MODES:
+        cloud = ilidar.Open3DPointCloud(len(points), mode)
+        if cloud.mode != mode:
+            continue
+        yield f'open3d.{mode}', lambda cloud=cloud: cloud.update(points)
+        # Point count changing every frame (valid points only)
+        state = [0]
+        def update_valid(cloud=cloud, state=state):
+            state[0] ^= 1
+            cloud.update(valid[state[0]])
+        yield f'open3d.{mode}_resize', update_valid
+
+# Host interface enumeration
+def bench_interfaces():
+    yield 'interfaces.get_interfaces_cached', lambda: ilidar.get_interfaces()
+    yield 'interfaces.get_interfaces_refresh', lambda: ilidar.get_interfaces(refresh=True)
+    yield 'interfaces.get_ip_list', lambda: ilidar.get_ip_list()
+
+# Callback-to-consumer hand-off through FrameTrampoline and FrameRing
+# A producer thread calls the trampoline like the native callback, a consumer thread drains the ring.
+def bench_handoff(n_frames=2000, n_slots=8):
+    results = {}
+    for policy in (ilidar.RING_POLICY_BLOCK, ilidar.RING_POLICY_DROP_OLDEST):
+        img = ilidar.make_synthetic_frames(1)[0].copy()
+        ring = ilidar.FrameRing(n_slots, img.shape, img.dtype, policy)
+        trampoline = ilidar.FrameTrampoline(img, ring)
+        out = np.zeros_like(img)
+        received = [0]
+        last_ns = [0]
+        done = threading.Event()
+        latency = ilidar.LatencyHistogram()
+        ring.latency_histogram = latency
+
+        # Drain the ring until the producer is done and the ring is empty
+        def consume():
+            while received[0] < n_frames:
+                if ring.get(timeout=0.01, out=out) is None:
+                    if done.is_set() and ring.pending() == 0:
+                        break
+                    continue
+                received[0] += 1
+                last_ns[0] = time.perf_counter_ns()
+
+        consumer = threading.Thread(target=consume, daemon=True)
+        consumer.start()
+        start_ns = time.perf_counter_ns()
+        for _ in range(n_frames):
+            trampoline(None)
+        produced_ns = time.perf_counter_ns() - start_ns
+        done.set()
+        consumer.join(5.0)
+        elapsed_ns = max(last_ns[0] - start_ns, 1)
+
+        results[f'handoff.{policy}'] = {
+            'frames': n_frames,
+            'received': received[0],
+            'producer_fps': n_frames * 1e9 / produced_ns,
+            'consumer_fps': received[0] * 1e9 / elapsed_ns,
+            'mb_per_s': received[0] * img.nbytes * 1e3 / elapsed_ns,
+            'callback_p50_us': trampoline.histogram.quantile(0.5) * 1e-3,
+            'callback_p99_us': trampoline.histogram.quantile(0.99) * 1e-3,
+            'consumer_latency_p50_us': latency.quantile(0.5) * 1e-3,
+            'consumer_latency_p99_us': latency.quantile(0.99) * 1e-3,
+        }
+    return results
+
+# Timed benchmark groups
+BENCH_GROUPS = {
+    'codec': bench_codec,
+    'reconstruct': bench_reconstruct,
+    'normalize': bench_normalize,
+    'temporal': bench_temporal,
+    'open3d': bench_open3d,
+    'interfaces': bench_interfaces,
+}
+
+# Run the selected groups (all if None)
+def run(groups=None, repeat=7, handoff_frames=2000):
+    if groups is None:
+        groups = list(BENCH_GROUPS.keys()) + ['handoff']
+
+    benchmarks = {}
+    for group in groups:
+        if group == 'handoff':
+            benchmarks.update(bench_handoff(handoff_frames))
+            continue
+        for name, func in BENCH_GROUPS[group]():
+            benchmarks[name] = measure(func, repeat)
+
+    return {
+        'machine': machine_info(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'benchmarks': benchmarks,
+    }
+
+# Compare a result against a baseline
+# Returns a list of (name, baseline, current, ratio) of the timed benchmarks that are slower by more than `threshold`
+def compare(result, baseline, threshold=0.1):
+    regressions = []
+    print(f"{'benchmark':<40}{'baseline':>14}{'current':>14}{'ratio':>9}")
+    for name, current in result['benchmarks'].items():
+        previous = baseline['benchmarks'].get(name)
+        if previous is None or 'min_us' not in current or 'min_us' not in previous:
+            continue
+        ratio = current['min_us'] / previous['min_us'] if previous['min_us'] > 0 else 1.0
+        mark = ' *' if ratio > 1.0 + threshold else ''
+        print(f"{name:<40}{previous['min_us']:>12.2f}us{current['min_us']:>12.2f}us{ratio:>9.2f}{mark}")
+        if ratio > 1.0 + threshold:
+            regressions.append((name, previous['min_us'], current['min_us'], ratio))
+
+    if baseline.get('machine', {}).get('platform') != result['machine']['platform']:
+        print("[WARNING] The baseline was recorded on a different platform.")
+    return regressions
+
+# Print a result
+def print_result(result):
+    for key, value in result['machine'].items():
+        print(f"  {key}: {value}")
+    for name, bench in result['benchmarks'].items():
+        if 'min_us' in bench:
+            print(f"{name:<40}{bench['min_us']:>12.2f}us (median {bench['median_us']:.2f}us, x{bench['number']})")
+        else:
+            print(f"{name:<40}{bench['consumer_fps']:>10.0f} fps (callback p99 {bench['callback_p99_us']:.1f}us, latency p99 {bench['consumer_latency_p99_us']:.1f}us)")
+
+#### MAIN ENTRY POINT ####
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ilidar.py benchmark suite")
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('-b', '--baseline', help="compare against this JSON file")
+    parser.add_argument('-g', '--group', action='append', choices=list(BENCH_GROUPS.keys()) + ['handoff'], help="run only this group (repeatable)")
+    parser.add_argument('-r', '--repeat', type=int, default=7, help="runs per benchmark")
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help="relative slowdown reported as a regression")
+    parser.add_argument('--handoff-frames', type=int, default=2000, help="frames per hand-off run")
+    args = parser.parse_args(argv)
+
+    result = run(args.group, args.repeat, args.handoff_frames)
+    print_result(result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as fp:
+            json.dump(result, fp, indent=2)
+        print(f"Results are written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        regressions = compare(result, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold * 100:.0f}%")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
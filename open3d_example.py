@@ -1,28 +1,9 @@
-import ctypes
 import sys
 import os
 import time
-import queue
 import numpy as np
 import open3d as o3d
-from ilidar import iTFS
-
-# Global variables
-callback_event_queue = queue.Queue()
-
-# Define the Python callback function
-CALLBACK_TYPE = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_uint16))
-
-# This callback function is used for data notification
-def python_callback(ptr):
-    # Print frame count
-    if not hasattr(python_callback, "frame_count"):
-        python_callback.frame_count = 0
-    print(f"F# {python_callback.frame_count}")
-    python_callback.frame_count += 1
-
-    # Send signal to main thread
-    callback_event_queue.put(python_callback.frame_count)
+from ilidar import iTFS, PointCloudReconstructor, PointCloudFilter, Open3DPointCloud, OPEN3D_MODE_LEGACY
 
 # Get dll path
 def get_full_dll_path():
@@ -47,6 +28,7 @@ def get_full_dll_path():
 
 # Create 3D viewer
 def init_viewer():
+    global cloud
     global pcd
     global vis
     
@@ -66,7 +48,9 @@ def init_viewer():
     vis.add_geometry(grid)
 
     # Create an initial empty point cloud
-    pcd = o3d.geometry.PointCloud()
+    # The geometry is updated in place every frame (the legacy visualizer draws legacy geometry)
+    cloud = Open3DPointCloud(mode=OPEN3D_MODE_LEGACY)
+    pcd = cloud.geometry
 
     # Add the point cloud to the visualizer
     vis.add_geometry(pcd)
@@ -112,40 +96,21 @@ def create_grid(size=10, step=1, color=[0.5, 0.5, 0.5], height=0):
 
     return grid
 
-# Read 3D reconstruction vectors from the file
-def read_intrinsic(file_path):
-    # Open the binary file in read mode
-    with open(file_path, "rb") as fp:
-        # Read the binary data and reshape into the desired array
-        vec = np.fromfile(fp, dtype=np.float32).reshape((240, 320, 3))
-    return vec[40:200, :, :]
-
 #### MAIN ENTRY POINT ####
 if __name__ == '__main__':
-    # Get intrinsic vector for 3d reconstruction
-    vec = read_intrinsic("iTFS-110.dat")
-    vec = vec.reshape(-1, 3)
-
-    # Rotate the vectors to X-front, Y-left, and Z-up Cartesian coordinates
-    vec_x = vec[:, 2].reshape(-1, 1)  # Reshape to 2D
-    vec_y = (-vec[:, 0]).reshape(-1, 1)
-    vec_z = (-vec[:, 1]).reshape(-1, 1)
-    vec_3d = np.concatenate((vec_x, vec_y, vec_z), axis=1)
+    # Intrinsic vector file of the sensor model for 3d reconstruction
+    intrinsic_file = "iTFS-110.dat"
 
     # Initialize point cloud viewer
     init_viewer()
 
-    # Create a 320x320 uint16 image buffer for sensor reading
-    img = np.zeros((320, 320), dtype=np.uint16)
-    img_ptr = img.ctypes.data_as(ctypes.POINTER(ctypes.c_uint16))
-
     # Get full path for the DLL file
     full_dll_path = get_full_dll_path()
 
     # Get new instance
+    # The sensor data is copied into a ring of 320x320 uint16 frames, so a slow loop never reads a torn frame
     LiDAR = iTFS(full_dll_path)
-    ctype_callback = CALLBACK_TYPE(python_callback)
-    if LiDAR.init(img_ptr, ctype_callback) == False:
+    if LiDAR.init_ring(n_slots=8) == False:
         sys.exit(0)
 
     # Create interface (Deprecated)
@@ -155,20 +120,16 @@ if __name__ == '__main__':
     # if LiDAR.create(pc_ip, pc_port) == False:
     #     sys.exit(0)
 
-    # Connect new sensor
+    # Connect new sensor (returns as soon as the sensor answers, up to 3 seconds)
     sensor_ip = "192.168.5.116" # To do: modify this IP to your network setup
     sensor_port = 7257          # Default
-    if LiDAR.connect(sensor_ip, sensor_port) == False:
+    if LiDAR.connect(sensor_ip, sensor_port, timeout=3.0) == False:
         LiDAR.destroy()
         sys.exit(0)
 
-    # Sleep a second
-    time.sleep(1)
-
     # Get parameters
     print("Connected sensor:")
-    read_params = LiDAR.get_params()
-    time.sleep(0.5)
+    read_params = LiDAR.get_params(timeout=1.0)
     LiDAR.print_params(read_params)
 
     # Modify parameters
@@ -181,33 +142,37 @@ if __name__ == '__main__':
     write_params['capture_seq'] = 0
     LiDAR.print_diff(read_params, write_params)
 
-    # Set parameters
-    LiDAR.unlock()
-    time.sleep(1)
-    LiDAR.set_params(write_params)
-    time.sleep(0.5)
+    # Set parameters (confirmed by read-back instead of fixed sleeps)
+    LiDAR.unlock(timeout=1.0)
+    LiDAR.set_params(write_params, timeout=2.0)
     LiDAR.store()
 
-    # Start stream
+    # Get intrinsic vector for 3d reconstruction, cropped to the rows of the active readout (capture_row)
+    # The vectors are rotated to X-front, Y-left, and Z-up Cartesian coordinates and scaled from mm to m once
+    reconstructor = PointCloudReconstructor.from_file(intrinsic_file, crop=LiDAR.layout.crop)
+
+    # Filter the organized depth and intensity images before reconstruction (None disables a stage)
+    # depth_range [mm], min_intensity, roi = (row_start, row_end, col_start, col_end), voxel_size [m]
+    point_filter = PointCloudFilter(reconstructor, depth_range=(100, 8000), min_intensity=None, roi=None, voxel_size=None, rows=LiDAR.layout.rows)
+
+    # Start stream (returns when the first frame has arrived)
     print("Start to stream data")
-    LiDAR.start()
+    LiDAR.start(timeout=2.0)
 
     # Infinite loop
     try:
         print("Press Ctrl+C to exit.")
         while True:
-            # Wait for queue
-            recv_frame_count = callback_event_queue.get()
-
-            # Get depth and intensity images from the raw output data
-            depth = img[:160, :]            # depth unit = mm
-            # intensity = img[160:, :]      # Not used in this example
+            # Wait for the next frame
+            recv_frame_count, recv_timestamp_ns, img = LiDAR.ring.get()
+            print(f"F# {recv_frame_count}")
 
-            # Reconstruct to 3D point cloud
-            points = 0.001 * vec_3d * depth.reshape(-1, 1)   # 0.001 for mm to m unit
+            # Reconstruct to 3D point cloud (only the pixels passing the filter)
+            # depth = img[:rows, :] (unit = mm), intensity = img[rows:, :] with rows = LiDAR.layout.rows (capture_row)
+            points = point_filter.apply(img)
 
             # Visualize
-            pcd.points = o3d.utility.Vector3dVector(points)
+            cloud.update(points)
             vis.update_geometry(pcd)
             vis.poll_events()
             vis.update_renderer()
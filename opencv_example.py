@@ -1,28 +1,7 @@
-import ctypes
 import sys
 import os
-import time
-import queue
-import numpy as np
 import cv2
-from ilidar import iTFS
-
-# Global variables
-callback_event_queue = queue.Queue()
-
-# Define the Python callback function
-CALLBACK_TYPE = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_uint16))
-
-# This callback function is used for data notification
-def python_callback(ptr):
-    # Print frame count
-    if not hasattr(python_callback, "frame_count"):
-        python_callback.frame_count = 0
-    print(f"F# {python_callback.frame_count}")
-    python_callback.frame_count += 1
-
-    # Send signal to main thread
-    callback_event_queue.put(python_callback.frame_count)
+from ilidar import iTFS, FrameColorizer
 
 # Get dll path
 def get_full_dll_path():
@@ -47,17 +26,13 @@ def get_full_dll_path():
 
 #### MAIN ENTRY POINT ####
 if __name__ == '__main__':
-    # Create a 320x320 uint16 image buffer for sensor reading
-    img = np.zeros((320, 320), dtype=np.uint16)
-    img_ptr = img.ctypes.data_as(ctypes.POINTER(ctypes.c_uint16))
-
     # Get full path for the DLL file
     full_dll_path = get_full_dll_path()
 
     # Get new instance
+    # The sensor data is copied into a ring of 320x320 uint16 frames, so a slow loop never reads a torn frame
     LiDAR = iTFS(full_dll_path)
-    ctype_callback = CALLBACK_TYPE(python_callback)
-    if LiDAR.init(img_ptr, ctype_callback) == False:
+    if LiDAR.init_ring(n_slots=8) == False:
         sys.exit(0)
 
     # Create interface (Deprecated)
@@ -67,20 +42,16 @@ if __name__ == '__main__':
     # if LiDAR.create(pc_ip, pc_port) == False:
     #     sys.exit(0)
 
-    # Connect new sensor
+    # Connect new sensor (returns as soon as the sensor answers, up to 3 seconds)
     sensor_ip = "192.168.5.116" # To do: modify this IP to your network setup
     sensor_port = 7257          # Default
-    if LiDAR.connect(sensor_ip, sensor_port) == False:
+    if LiDAR.connect(sensor_ip, sensor_port, timeout=3.0) == False:
         LiDAR.destroy()
         sys.exit(0)
 
-    # Sleep a second
-    time.sleep(1)
-
     # Get parameters
     print("Connected sensor:")
-    read_params = LiDAR.get_params()
-    time.sleep(0.5)
+    read_params = LiDAR.get_params(timeout=1.0)
     LiDAR.print_params(read_params)
 
     # Modify parameters
@@ -93,31 +64,30 @@ if __name__ == '__main__':
     write_params['capture_seq'] = 0
     LiDAR.print_diff(read_params, write_params)
 
-    # Set parameters
-    LiDAR.unlock()
-    time.sleep(1)
-    LiDAR.set_params(write_params)
-    time.sleep(0.5)
+    # Set parameters (confirmed by read-back instead of fixed sleeps)
+    LiDAR.unlock(timeout=1.0)
+    LiDAR.set_params(write_params, timeout=2.0)
     LiDAR.store()
 
-    # Start stream
+    # Start stream (returns when the first frame has arrived)
     print("Start to stream data")
-    LiDAR.start()
+    LiDAR.start(timeout=2.0)
+
+    # Lookup tables to convert the depth (0 to 8 m) and intensity (0 to 16384) images to 8-bit images
+    # The images have the rows of the active readout (capture_row)
+    # To display the depth in color, use depth_colormap='jet' (or 'viridis', 'inferno')
+    colorizer = FrameColorizer(depth_range=(0, 8000), intensity_range=(0, 16384), rows=LiDAR.layout.rows)
 
     # Infinite loop
     try:
         print("Press Ctrl+C to exit.")
         while True:
-            # Wait for queue
-            recv_frame_count = callback_event_queue.get()
+            # Wait for the next frame
+            recv_frame_count, recv_timestamp_ns, img = LiDAR.ring.get()
+            print(f"F# {recv_frame_count}")
     
-            # Get depth and intensity images from the raw output data
-            depth = img[:160, :]         # depth unit = [mm] 
-            intensity = img[160:, :]
-
-            # Normalize to display
-            depth_norm = np.clip((depth / 8000) * 255, 0, 255).astype(np.uint8) # normalized from 0 to 8 m
-            intensity_norm = np.clip((intensity / 16384) * 255, 0, 255).astype(np.uint8)
+            # Normalize depth (img[:rows, :], unit = [mm]) and intensity (img[rows:, :]) images to display
+            depth_norm, intensity_norm = colorizer.colorize(img)
 
             # Display using opencv
             cv2.imshow("DEPTH", depth_norm)
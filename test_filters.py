@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import ilidar
+
+# Tests of the temporal depth filters of ilidar.py
+#   $ python -m pytest test_filters.py
+
+# TemporalMedianFilter against np.median over the window of the last frames
+# Covers even windows (and the warm-up, where the filled count is even), motion gating and out=depth.
+@pytest.mark.parametrize('window', [4, 5])
+@pytest.mark.parametrize('motion_threshold', [None, 150])
+@pytest.mark.parametrize('in_place', [False, True])
+def test_temporal_median(window, motion_threshold, in_place, n_frames=12):
+    rng = np.random.default_rng(0)
+    temporal_filter = ilidar.TemporalMedianFilter(window, motion_threshold, (8, 8))
+    history = []
+    for index in range(n_frames):
+        depth = (1000 + rng.integers(0, 20, (8, 8))).astype(np.uint16)
+        if index % 5 == 3:
+            depth[2, 3] = 3000
+        history = (history + [depth.astype(np.int64)])[-window:]
+        expected = np.median(np.array(history), axis=0).astype(np.int64)
+        if motion_threshold is not None:
+            # Moving pixels take the incoming depth and restart their history from it
+            moving = np.abs(depth - expected) > motion_threshold
+            expected[moving] = depth[moving]
+            for frame in history:
+                frame[moving] = depth[moving]
+
+        out = depth.copy()
+        result = temporal_filter.update(out, out=out if in_place else None)
+        np.testing.assert_array_equal(result, expected, err_msg=f"frame {index}")